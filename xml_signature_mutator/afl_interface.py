@@ -6,7 +6,6 @@ import json
 import logging
 import os
 import pathlib
-import pickle
 import random
 import socket
 import sys
@@ -16,18 +15,54 @@ from operator import add
 
 import yaml
 from lxml import etree
-from onelogin.saml2.utils import OneLogin_Saml2_XML
-from plugin_base import plugin_util
+from plugin_base import metric_combination, plugin_util, seed_corpus
+from plugin_base.alias_sampler import AliasSampler
+from plugin_base.mutation_result import MutationResult
+from plugin_base.rng import derive_rng
+from runtime.analysis_pool import AnalysisPool
+from runtime.checkpoint import Checkpointer
+from runtime.init_cache import InitCache
+from runtime.phase_timer import PhaseTimer
+from runtime.profile_store import ProfileStore
+from runtime.shared_stats import COUNTERS as SHARED_COUNTERS
+from runtime.shared_stats import SharedStats
+from runtime.signature_repair import SignatureRepair
+from runtime.stacking import StackingScheduler
+from runtime.stats_sink import StatsSink
+from runtime.tree_cache import TreeCache, content_hash
+from runtime.xml_trimmer import XmlTrimmer
+from validation.validation_policy import ValidationPolicy
+from validation.validity_oracle import ValidityOracle
 
 PLUGIN_STATE = {
     "mutators": None,
     "fallback_mutator": None,
     "metrics": None,
+    "metric_combination": None,
+    "scheduler": None,
+    "validator": None,
+    "validation_policy": None,
+    "analysis_pool": None,
     "parser": None,
+    "tree_cache": None,
+    "profiles": None,
+    "trimmer": None,
+    "signature_repair": None,
+    "stacking": None,
+    "phase_timer": None,
+    "stats_sink": None,
+    "checkpointer": None,
+    "init_cache": None,
+    "mutator_sampler": None,
+    "rng": None,
+    "shared_stats": None,
+    "evidence": None,
 }
 
 STATE = {
     "last_mutation": None,
+    "last_chain": None,
+    "last_stack_length": None,
     "prob_dist": None,
     "start_time": None,
     "stage_duration": None,
@@ -41,10 +76,31 @@ STATE = {
 
 DATA = {}
 
+# STATE entries that are recreated on restore instead of being checkpointed
+TRANSIENT_STATE = ("logger",)
+
 
 def init(seed: bytearray):
     """Called at startup."""
 
+    backup_dir = os.getenv(
+        "BACKUP_DIR", str(pathlib.Path(__file__).parent.resolve().joinpath(".backup/"))
+    )
+    STATE.update({"backup_dir": pathlib.Path(backup_dir)})
+    checkpointer = Checkpointer(
+        directory=STATE.get("backup_dir"),
+        full_every=int(os.getenv("CHECKPOINT_FULL_EVERY", "6")),
+    )
+    PLUGIN_STATE.update({"checkpointer": checkpointer})
+    # parsed configs and the pools of the initial inputs, reused by restarts. INIT_CACHE=0
+    # disables it.
+    init_cache = None
+    if os.getenv("INIT_CACHE", "1") != "0":
+        init_cache = InitCache(
+            os.getenv("INIT_CACHE_DIR", str(STATE.get("backup_dir").joinpath("init-cache/")))
+        )
+    PLUGIN_STATE.update({"init_cache": init_cache})
+
     dont_restore = os.getenv("DONT_RESTORE")
     if dont_restore is None:
         if restore():
@@ -62,11 +118,6 @@ def init(seed: bytearray):
     )
     STATE.update({"cfg_dir": pathlib.Path(cfg_dir)})
 
-    backup_dir = os.getenv(
-        "BACKUP_DIR", str(pathlib.Path(__file__).parent.resolve().joinpath(".log/"))
-    )
-    pathlib.Path(backup_dir).mkdir(exist_ok=True, parents=True)
-
     init_logging()
     load_plugins()
     init_prob_dist()
@@ -83,8 +134,6 @@ def fuzz(buffer: bytearray, additional_buffer: bytearray, max_size: int) -> byte
     max_size: maximal size that the result might have
     """
 
-    logger = STATE.get("logger")
-
     now = datetime.now()
 
     # Back up state every 600 seconds / 10 minutes
@@ -93,64 +142,177 @@ def fuzz(buffer: bytearray, additional_buffer: bytearray, max_size: int) -> byte
         backup()
     current_stage_secs = (now - STATE.get("start_time")).total_seconds()
 
+    shared_stats = PLUGIN_STATE.get("shared_stats")
+    if shared_stats is not None and shared_stats.due():
+        sync_shared_stats()
+
+    if PLUGIN_STATE.get("analysis_pool").enabled:
+        collect_analysis()
+
     # Adjust probabilities by using metrics and collected data
     if STATE.get("stage_duration") < current_stage_secs:
         handle_stage_change()
 
-    # Handle mutation
+    # Handle mutation, the phases of the call are attributed to the mutators that performed it
+    phase_timer = PLUGIN_STATE.get("phase_timer")
+    phase_timer.begin()
+    try:
+        return mutate_input(buffer, additional_buffer, max_size)
+    finally:
+        phase_timer.flush(DATA)
+
+
+def mutate_input(buffer, additional_buffer, max_size):
+    """Mutate the input with the chosen mutator(s), use the fallback mutator if that fails."""
+    logger = STATE.get("logger")
+    phase_timer = PLUGIN_STATE.get("phase_timer")
+
+    # Everything that is cached per input uses the same key
+    phase_timer.start("parse")
+    key = content_hash(buffer)
+    profile = PLUGIN_STATE.get("profiles").get(buffer, key)
 
     xml_tree = None
     # Check if input is parsable, if not use fallback mutator
+    if not profile.parsable:
+        phase_timer.stop("parse")
+        logger.debug("Input not parsable. Use fallback mutator.")
+        return exec_fallback_mutator(buffer, additional_buffer, max_size, profile)
     try:
-        xml_tree = etree.parse(io.BytesIO(buffer))
+        xml_tree = PLUGIN_STATE.get("tree_cache").get_tree(buffer, key)
     except Exception as exp:
+        phase_timer.stop("parse")
         logger.debug("Input not parsable. Use fallback mutator. %s.", exp)
-        mutated_input = exec_fallback_mutator(buffer, additional_buffer, max_size)
+        mutated_input = exec_fallback_mutator(buffer, additional_buffer, max_size, profile)
         return mutated_input
+    phase_timer.stop("parse")
 
-    root = xml_tree.getroot()
-    if len(root.getchildren()) == 0:
+    phase_timer.start("selection")
+    STATE.update({"last_stack_length": None})
+    if profile.element_count < 2:
         logger.debug("Input has only root element. Most mutators would fail. Chose insert element.")
-        mutator = PLUGIN_STATE["mutators"].get("iel")
-        mutator_id = mutator.identifier
+        chain = [PLUGIN_STATE["mutators"].get("iel")]
     else:
-        # Choose mutator for mutation based on probability distribution
-        mutator = random.choices(
-            population=list(PLUGIN_STATE.get("mutators").values()),
-            weights=STATE.get("prob_dist").values(),
-            k=1,
-        ).pop()
-        mutator_id = mutator.identifier
-
-    mutated_input = None
+        # Choose mutator(s) for mutation based on probability distribution
+        chain = select_mutators()
+    mutator_ids = [mutator.identifier for mutator in chain]
+    phase_timer.owners = mutator_ids
+    phase_timer.stop("selection")
+
+    result = None
     # Perform mutation
     try:
-        STATE.update({"last_mutation": mutator_id})
-        DATA[mutator_id]["execs"] += 1
-        mutated_input = mutator.mutate(buffer, xml_tree, additional_buffer, max_size)
+        STATE.update({"last_mutation": "+".join(mutator_ids)})
+        STATE.update({"last_chain": mutator_ids})
+        count_data(mutator_ids, "execs")
+        result = exec_mutators(chain, buffer, xml_tree, additional_buffer, max_size)
     except Exception as exp:
-        logger.error("Uncaught exception during mutate call of %s: %s", mutator_id, exp)
+        logger.error(
+            "Uncaught exception during mutate call of %s: %s", STATE.get("last_mutation"), exp
+        )
         return bytearray(1)
 
     # analyze mutated input
-    if analyze_result(buffer, mutated_input, mutator_id, max_size) == buffer:
-        logger.error("Mutation of %s was not successful. Perform fallback mutation", mutator_id)
-        mutated_input = exec_fallback_mutator(buffer, additional_buffer, max_size)
+    mutated_input = analyze_result(buffer, result, mutator_ids, max_size)
+    if mutated_input == buffer:
+        logger.error(
+            "Mutation of %s was not successful. Perform fallback mutation",
+            STATE.get("last_mutation"),
+        )
+        mutated_input = exec_fallback_mutator(buffer, additional_buffer, max_size, profile)
 
     return mutated_input
 
 
-def exec_fallback_mutator(buffer, additional_buffer, max_size):
+def select_mutators() -> list:
+    """Choose the mutators for the next mutation based on the probability distribution.
+
+    Without stacking, this is a single mutator. With stacking, it is a chain of mutators that
+    are applied to the same tree. String-level mutators can only be applied last, so the first
+    string-level mutator ends the chain.
+    """
+    stacking = PLUGIN_STATE.get("stacking")
+    length = 1
+    if stacking.enabled:
+        length = stacking.chain_length()
+        STATE.update({"last_stack_length": length})
+
+    scheduler = PLUGIN_STATE.get("scheduler")
+    if scheduler is not None:
+        mutators = PLUGIN_STATE.get("mutators")
+        chain = [mutators[identifier] for identifier in scheduler.choose(length)]
+    else:
+        chain = mutator_sampler().sample_k(length, PLUGIN_STATE.get("rng"))
+
+    for position, mutator in enumerate(chain):
+        if not mutator.tree_level:
+            return chain[: position + 1]
+    return chain
+
+
+def mutator_sampler() -> AliasSampler:
+    """Return the sampler for the current probability distribution.
+
+    The sampler is only rebuilt if STATE["prob_dist"] was replaced, i.e., at stage changes.
+    The distribution is never modified in place.
+    """
+    prob_dist = STATE.get("prob_dist")
+    cached = PLUGIN_STATE.get("mutator_sampler")
+    if cached is None or cached[0] is not prob_dist:
+        mutators = PLUGIN_STATE.get("mutators")
+        sampler = AliasSampler(
+            [mutators[identifier] for identifier in prob_dist], prob_dist.values()
+        )
+        cached = (prob_dist, sampler)
+        PLUGIN_STATE.update({"mutator_sampler": cached})
+    return cached[1]
+
+
+def exec_mutators(chain, buffer, xml_tree, additional_buffer, max_size) -> MutationResult:
+    """Apply the chain of mutators to the tree and serialize the result once."""
+    phase_timer = PLUGIN_STATE.get("phase_timer")
+
+    phase_timer.start("mutate")
+    changed = False
+    result = None
+    for mutator in chain:
+        if mutator.tree_level:
+            changed = mutator.mutate_tree(xml_tree) or changed
+            continue
+
+        # string-level mutators are always last, they serialize the tree themselves
+        result = mutator.mutate(buffer, xml_tree, additional_buffer, max_size)
+    phase_timer.stop("mutate")
+
+    if result is not None and result.output is not buffer:
+        return result
+    if not changed:
+        return MutationResult(buffer)
+
+    phase_timer.start("serialize")
+    result = chain[0]._tree_result(xml_tree)
+    phase_timer.stop("serialize")
+    return result
+
+
+def exec_fallback_mutator(buffer, additional_buffer, max_size, profile=None):
     logger = STATE.get("logger")
     mutator = PLUGIN_STATE.get("fallback_mutator")
+    phase_timer = PLUGIN_STATE.get("phase_timer")
+    # a fallback after a failed mutation is part of the cost of the failed mutators
+    if not phase_timer.owners:
+        phase_timer.owners = ["fallback_mutator"]
+    phase_timer.start("fallback")
     try:
         STATE.update({"last_mutation": "fallback_mutator"})
+        STATE.update({"last_chain": ["fallback_mutator"]})
         DATA["fallback_mutator"]["execs"] += 1
-        mutated_input = mutator.mutate(buffer, None, additional_buffer, max_size)
+        result = mutator.mutate(buffer, None, additional_buffer, max_size, profile=profile)
 
-        mutated_input = analyze_result(buffer, mutated_input, "fallback_mutator", max_size)
+        mutated_input = analyze_result(buffer, result, ["fallback_mutator"], max_size)
     except Exception as exp:
         logger.error("Exception caught during fallback mutate call. %s", exp)
+    phase_timer.stop("fallback")
 
     return mutated_input
 
@@ -178,7 +340,13 @@ def introspection() -> bytearray:
 
     STATE.get("logger").debug("New finding with mutator %s.", _last_mut)
 
-    DATA[_last_mut]["new_finds"] += 1
+    # every mutator of a stacked mutation gets the finding attributed
+    count_data(STATE.get("last_chain") or [_last_mut], "new_finds")
+    if STATE.get("last_stack_length") and STATE.get("last_chain") != ["fallback_mutator"]:
+        PLUGIN_STATE.get("stacking").record_find(STATE.get("last_stack_length"))
+    scheduler = PLUGIN_STATE.get("scheduler")
+    if scheduler is not None and STATE.get("last_chain"):
+        scheduler.record_find(STATE.get("last_chain"))
 
     # we COULD call STATE.get("mutators")[_last_mut] to give feedback to fuzzer!
     # enables smart mutators
@@ -191,20 +359,133 @@ def introspection() -> bytearray:
 def deinit():
     # i can safe state here
     # called after fuzzing stops
-    logger = STATE.get("logger")
-    logger.info(json.dumps(DATA, indent=2))
-    logger.info(json.dumps(DATA, indent=2))
+    validate_deferred()
+    PLUGIN_STATE.get("analysis_pool").close()
+    collect_analysis()
+    checkpoint()
+    PLUGIN_STATE.get("checkpointer").flush()
+    stats_sink = PLUGIN_STATE.get("stats_sink")
+    stats_sink.snapshot("final", DATA, STATE)
+    stats_sink.close()
+    if PLUGIN_STATE.get("shared_stats") is not None:
+        sync_shared_stats()
+        PLUGIN_STATE.get("shared_stats").close()
+
+
+def fuzz_count(buffer: bytearray) -> int:
+    """Called by AFL++ once per queue entry before it is fuzzed.
+
+    Args:
+        buffer (bytearray): the queue entry
+
+    Returns:
+        int: number of fuzz iterations for this entry. Scales with the structural richness of
+            the entry, unparsable entries get a short budget.
+    """
+    profiles = PLUGIN_STATE.get("profiles")
+    return profiles.energy(profiles.get(buffer))
+
+
+def init_trim(buffer: bytearray) -> int:
+    """Called by AFL++ once per queue entry before it is trimmed.
+
+    Args:
+        buffer (bytearray): the queue entry
+
+    Returns:
+        int: number of trimming steps. Subtrees, attributes and texts are removed one at a
+            time, unparsable entries are trimmed in chunks (see XmlTrimmer).
+    """
+    return PLUGIN_STATE.get("trimmer").init(buffer)
+
+
+def trim() -> bytearray:
+    """Called by AFL++ for every trimming step.
+
+    Returns:
+        bytearray: the entry with the next step applied
+    """
+    return bytearray(PLUGIN_STATE.get("trimmer").trim())
+
+
+def post_trim(success: bool) -> int:
+    """Called by AFL++ after every trimming step.
+
+    Args:
+        success (bool): True, if the trimmed entry has the same coverage. It is kept then.
+
+    Returns:
+        int: index of the next step. Trimming ends at the number of steps of init_trim.
+    """
+    return PLUGIN_STATE.get("trimmer").post_trim(success)
+
+
+def post_process(buffer: bytearray) -> bytearray:
+    """Called by AFL++ for every input before it is executed.
+
+    Args:
+        buffer (bytearray): the mutant
+
+    Returns:
+        bytearray: the mutant with recomputed digests and signatures, if SIGNATURE_REPAIR_KEY
+            is set and the mutant is selected (see SignatureRepair), otherwise the mutant
+    """
+    signature_repair = PLUGIN_STATE.get("signature_repair")
+    if not signature_repair.enabled:
+        return buffer
+    return bytearray(signature_repair.repair(buffer))
 
 
-# def fuzz_count(buffer):
-#    try:
-#        xml_tree = etree.parse(io.BytesIO(buffer))
-#        root = xml_tree.getroot()
-#        if len(root.getchildren()) == 0:
-#            return 1
-#    except Exception:
-#        return 1
-#    return 19
+def queue_new_entry(filename_new_queue: str, filename_orig_queue: str) -> bool:
+    """Called by AFL++ after a new entry was added to the queue. Computes the profile of the
+    entry, so it is available for all of its fuzz iterations.
+
+    Args:
+        filename_new_queue (str): file name of the new queue entry
+        filename_orig_queue (str): file name of the entry it was derived from, if any
+
+    Returns:
+        bool: True, if the file was modified. It never is.
+    """
+    try:
+        with open(filename_new_queue, "rb") as file:
+            PLUGIN_STATE.get("profiles").get(file.read())
+    except OSError as exp:
+        STATE.get("logger").debug("Could not read new queue entry %s. %s.", filename_new_queue, exp)
+
+    return False
+
+
+def queue_get(filename: str) -> bool:
+    """Called by AFL++ before a queue entry is fuzzed. Makes sure the profile of the entry is
+    known (e.g., for entries that were in the queue before a restart).
+
+    Args:
+        filename (str): file name of the queue entry
+
+    Returns:
+        bool: True, if the entry should be fuzzed. Always True, the budget of the entry is
+            decided by fuzz_count.
+    """
+    try:
+        with open(filename, "rb") as file:
+            PLUGIN_STATE.get("profiles").get(file.read())
+    except OSError as exp:
+        STATE.get("logger").debug("Could not read queue entry %s. %s.", filename, exp)
+
+    return True
+
+
+def load_config(file) -> dict:
+    """Parse an open YAML configuration file. Uses the init cache, if it is enabled.
+
+    Raises:
+        yaml.YAMLError: if the file cannot be parsed
+    """
+    init_cache = PLUGIN_STATE.get("init_cache")
+    if init_cache is None:
+        return yaml.safe_load(file)
+    return init_cache.load_yaml(file.read())
 
 
 def init_logging(keep=False) -> None:
@@ -222,7 +503,7 @@ def init_logging(keep=False) -> None:
     try:
         with open(logging_cfg_path, encoding="utf-8") as file:
             try:
-                logging_cfg = yaml.safe_load(file)
+                logging_cfg = load_config(file)
             except yaml.YAMLError as exc:
                 sys.exit(
                     "Error reading logging configuration file at: %s. %s.", logging_cfg_path, exc
@@ -282,9 +563,86 @@ def load_plugins() -> None:
     etree.set_default_parser(parser)
     PLUGIN_STATE.update({"parser": parser})
 
+    # the cache counters are part of the collected data
+    tree_cache = TreeCache(
+        max_entries=int(os.getenv("TREE_CACHE_ENTRIES", "32")),
+        max_bytes=int(os.getenv("TREE_CACHE_BYTES", str(16 * 1024 * 1024))),
+        stats=DATA.setdefault("tree_cache", {}),
+    )
+    PLUGIN_STATE.update({"tree_cache": tree_cache})
+
+    profiles = ProfileStore(
+        min_energy=int(os.getenv("MIN_ENERGY", "8")),
+        max_energy=int(os.getenv("MAX_ENERGY", "256")),
+        unparsable_energy=int(os.getenv("UNPARSABLE_ENERGY", "2")),
+        tree_cache=tree_cache,
+    )
+    PLUGIN_STATE.update({"profiles": profiles})
+
+    trimmer = XmlTrimmer(
+        parser=parser,
+        stats=DATA.setdefault("trimming", {}),
+        max_steps=int(os.getenv("TRIM_MAX_STEPS", "256")),
+    )
+    PLUGIN_STATE.update({"trimmer": trimmer})
+
+    # opt-in, needs a test key the target trusts
+    signature_repair = SignatureRepair(
+        key_file=os.getenv("SIGNATURE_REPAIR_KEY"),
+        cert_file=os.getenv("SIGNATURE_REPAIR_CERT"),
+        rate=float(os.getenv("SIGNATURE_REPAIR_RATE", "1")),
+        parser=parser,
+        stats=DATA.setdefault("signature_repair", {}),
+    )
+    PLUGIN_STATE.update({"signature_repair": signature_repair})
+
+    phase_timer = PhaseTimer(
+        enabled=os.getenv("PHASE_TIMING", "1") != "0", stats=DATA.setdefault("phase_timer", {})
+    )
+    PLUGIN_STATE.update({"phase_timer": phase_timer})
+
+    # statistics are written to a CSV file next to the log, not to the log itself
+    stats_sink = StatsSink(
+        path=STATE.get("log_dir").joinpath(
+            "xml_signature_mutator-stats-" + socket.gethostname() + ".csv"
+        ),
+        max_bytes=int(os.getenv("STATS_MAX_BYTES", str(64 * 1024 * 1024))),
+        backup_count=int(os.getenv("STATS_BACKUPS", "5")),
+    )
+    PLUGIN_STATE.update({"stats_sink": stats_sink})
+
     logger = STATE.get("logger")
     cfg_dir = STATE.get("cfg_dir")
 
+    # opt-in: share the counters with all instances that use the same directory (e.g., the
+    # sync dir of AFL++). Metrics and schedulers then use the counters of all instances.
+    PLUGIN_STATE.update({"shared_stats": None, "evidence": DATA})
+    if os.getenv("SHARED_STATS_DIR"):
+        # a restarted instance republishes its restored counters, so it needs the same slot.
+        # AFL++ passes its output directory, it ends with the name given by -M/-S. Otherwise,
+        # the name is kept in STATE and restored with it.
+        previous = STATE.get("shared_stats_instance")
+        instance = os.getenv("SHARED_STATS_INSTANCE")
+        if instance is None and os.getenv("AFL_CUSTOM_INFO_OUT"):
+            instance = pathlib.Path(os.getenv("AFL_CUSTOM_INFO_OUT")).name
+        if instance is None:
+            instance = previous or f"pid-{os.getpid()}"
+        try:
+            shared_stats = SharedStats(
+                path=pathlib.Path(os.getenv("SHARED_STATS_DIR")).joinpath(
+                    "xml_signature_mutator.stats"
+                ),
+                instance=instance,
+                previous=previous,
+                interval=float(os.getenv("SHARED_STATS_INTERVAL", "1")),
+            )
+        except (OSError, ValueError) as exp:
+            logger.error("Could not share statistics, continue without. %s", exp)
+        else:
+            STATE.update({"shared_stats_instance": instance})
+            PLUGIN_STATE.update({"shared_stats": shared_stats, "evidence": {}})
+            logger.info("Sharing statistics in %s as %s.", shared_stats.path, instance)
+
     # /fuzz/config
     if os.getenv("MUTATOR_CFG_PATH"):
         mutators_cfg_path = pathlib.Path(os.getenv("MUTATOR_CFG_PATH"))
@@ -296,14 +654,36 @@ def load_plugins() -> None:
     else:
         metrics_cfg_path = cfg_dir.joinpath("metrics.yaml")
 
+    if os.getenv("VALIDATION_CFG_PATH"):
+        validation_cfg_path = pathlib.Path(os.getenv("VALIDATION_CFG_PATH"))
+    else:
+        validation_cfg_path = cfg_dir.joinpath("validation.yaml")
+
     seed = STATE.get("seed")
+    # every plugin draws from its own generator, the mutator selection as well
+    PLUGIN_STATE.update({"rng": derive_rng(seed, "mutator_selection")})
+
+    # parse the initial inputs once, all mutators share the extracted pools. With
+    # FRAGMENT_STORE_DIR, all instances on the machine share them in a memory-mapped file.
+    # Otherwise, the pools are kept in the init cache, so restarts do not parse the inputs.
+    init_cache = PLUGIN_STATE.get("init_cache")
+    fragment_store_path = None
+    if os.getenv("FRAGMENT_STORE_DIR"):
+        fragment_store_path = pathlib.Path(os.getenv("FRAGMENT_STORE_DIR")).joinpath(
+            "xml_signature_mutator.fragments"
+        )
+    seed_corpus.load_corpus(
+        os.getenv("INPUT_DIR"),
+        fragment_store_path,
+        init_cache.corpus_path if init_cache is not None else None,
+    )
 
     logger.info("Loading plugins.")
 
     with open(mutators_cfg_path, encoding="utf-8") as file:
         plugin_type = "mutator"
         try:
-            mutator_cfg = yaml.safe_load(file)
+            mutator_cfg = load_config(file)
             logger.info("Loaded mutator config file")
 
             logger.debug("Load mutator plugins")
@@ -324,16 +704,33 @@ def load_plugins() -> None:
             logger.debug("Load fallback mutator")
             # load fallback mutator separately
             tmp_plugin = plugin_util.create_plugin(
-                mutator_cfg["fallback_mutator_cfg"].pop()
-                | {"identifier": "fallback_mutator"}
+                mutator_cfg["fallback_mutator_cfg"].pop() | {"identifier": "fallback_mutator"}
             )
             tmp_plugin.init(seed)
             PLUGIN_STATE.update({"fallback_mutator": tmp_plugin})
 
+            logger.debug("Configure stacked mutations")
+            stacking = StackingScheduler(
+                **mutator_cfg.get("stacking", {}),
+                stats=DATA.setdefault("stacking", {}),
+                rng=derive_rng(seed, "stacking"),
+            )
+            PLUGIN_STATE.update({"stacking": stacking})
+
+            if PLUGIN_STATE.get("shared_stats") is not None:
+                try:
+                    PLUGIN_STATE.get("shared_stats").register(
+                        list(PLUGIN_STATE.get("mutators").keys()) + ["fallback_mutator"]
+                    )
+                except ValueError as exp:
+                    logger.error("Could not share statistics, continue without. %s", exp)
+                    PLUGIN_STATE.get("shared_stats").close()
+                    PLUGIN_STATE.update({"shared_stats": None, "evidence": DATA})
+
             plugin_type = "metric"
 
             with open(metrics_cfg_path, encoding="utf-8") as file:
-                metric_cfg = yaml.safe_load(file)
+                metric_cfg = load_config(file)
                 logger.info("Loaded metric config file")
 
             logger.debug("Load metric plugins")
@@ -346,6 +743,61 @@ def load_plugins() -> None:
                 logger.info("Loaded and created plugin %s", tmp_plugin.identifier)
             PLUGIN_STATE.update({"metrics": tmp_loaded_plugins})
 
+            combination = metric_cfg.get("combination", "weighted_sum")
+            if combination not in metric_combination.COMBINATIONS:
+                raise ValueError(f"Unknown metric combination {combination!r}")
+            # combine ignores metrics with weight 0, it fails at the first stage change otherwise
+            if tmp_loaded_plugins and not any(
+                metric.weight > 0 for metric in tmp_loaded_plugins.values()
+            ):
+                raise ValueError("At least one metric needs a weight greater than 0")
+            PLUGIN_STATE.update({"metric_combination": combination})
+
+            plugin_type = "scheduler"
+
+            selection = metric_cfg.get("selection", "stage")
+            scheduler = None
+            if selection == "online":
+                logger.debug("Load scheduler plugins")
+                plugin_util.load_plugins("schedulers.", metric_cfg["scheduler_plugins"])
+                scheduler = plugin_util.create_plugin(metric_cfg["scheduler_cfg"])
+                scheduler.init(list(PLUGIN_STATE.get("mutators").keys()), DATA, seed)
+                # execs and findings of all instances, if they are shared
+                scheduler.data = PLUGIN_STATE.get("evidence")
+                logger.info("Loaded and created scheduler %s", scheduler.identifier)
+            elif selection != "stage":
+                raise ValueError(f"Unknown mutator selection {selection!r}")
+            PLUGIN_STATE.update({"scheduler": scheduler})
+
+            plugin_type = "validator"
+
+            validation_cfg = {}
+            try:
+                with open(validation_cfg_path, encoding="utf-8") as file:
+                    validation_cfg = load_config(file) or {}
+                    logger.info("Loaded validation config file")
+            except FileNotFoundError:
+                logger.info("No validation config file found. Use default validation tiers.")
+            policy = ValidationPolicy(
+                **validation_cfg.pop("policy", {}),
+                stats=DATA.setdefault("validation", {}),
+                rng=derive_rng(seed, "validation_policy"),
+            )
+            PLUGIN_STATE.update({"validation_policy": policy})
+            logger.info("Validation mode: %s", policy.mode)
+            pool_cfg = validation_cfg.pop("pool", {})
+            PLUGIN_STATE.update({"validator": ValidityOracle(**validation_cfg)})
+            if policy.mode != "deferred":
+                # validated from the first iteration on, and before the analysis pool forks
+                PLUGIN_STATE.get("validator").compile_schema()
+            analysis_pool = AnalysisPool(
+                **pool_cfg, oracle_cfg=validation_cfg, stats=DATA.setdefault("analysis_pool", {})
+            )
+            PLUGIN_STATE.update({"analysis_pool": analysis_pool})
+            if analysis_pool.enabled:
+                logger.info("Validating in %d worker processes.", analysis_pool.workers)
+            logger.info("Validation tiers: %s", PLUGIN_STATE.get("validator").tiers)
+
         except yaml.YAMLError as exc:
             logger.critical(f"Could not read {plugin_type} config file. Exiting...")
             sys.exit(f"Could not read {plugin_type} config file. Exiting...")
@@ -356,9 +808,15 @@ def load_plugins() -> None:
             logger.critical(f"Could not create {plugin_type}. {exp}. Aborting...")
             sys.exit("Aborting due to bad configuration. Check log for information.")
         except ModuleNotFoundError as exp:
-            logger.critical("Could not create {plugin_type}. {exp}. Aborting...",)
+            logger.critical(
+                "Could not create {plugin_type}. {exp}. Aborting...",
+            )
             sys.exit("Aborting due to bad configuration. Check log for information.")
 
+    if init_cache is not None:
+        logger.info("Init cache: %d configs reused, %d parsed.", init_cache.hits, init_cache.misses)
+        init_cache.save()
+
 
 def init_prob_dist() -> None:
     """Initializes the probability distribution for the mutators.
@@ -389,12 +847,14 @@ def init_data() -> None:
                     "execs": 0,
                     "successful_mut": 0,
                     "percent_successful_mut": 0,
+                    "validated": 0,
                     "well_formed": 0,
                     "percent_well_formed": 0,
                     "saml_valid": 0,
                     "percent_saml_valid": 0,
                     "new_finds": 0,
                     "percent_new_finds": 0,
+                    "phases": {},
                 }
             }
         )
@@ -404,52 +864,44 @@ def init_data() -> None:
     STATE.update({"stage_duration": int(os.getenv("STAGE_DURATION", "7200"))})
 
 
-def analyze_result(buffer, mutated_input, mutator_id, max_size):
+def analyze_result(buffer, result, mutator_ids, max_size):
     """Analyze the mutated_input for mutation success, size conformity, validity and saml_validity.
     Return mutated input if successful, and buffer if not.
 
+    If the mutator handed over the mutated tree, it is used for the validity checks. Only
+    results of string-level mutators are parsed again. Depending on the validation policy, only
+    some of the successful mutants are checked for validity, or the checks are deferred.
+
     Args:
-        buffer (_type_): _description_
-        mutated_input (_type_): _description_
-        mutator_id (_type_): _description_
-        max_size (_type_): _description_
-        count_result (bool, optional): _description_. Defaults to True.
+        buffer (bytearray): the original input
+        result (MutationResult): the result of the mutate call
+        mutator_ids (list): identifiers of the mutators that produced the result. More than one,
+            if stacked mutations were applied. The result is counted for each of them.
+        max_size (int): maximal size that the result might have
 
     Returns:
-        _type_: _description_
+        bytearray: the mutated input, if the mutation was successful. Otherwise, buffer.
     """
     logger = STATE.get("logger")
+    policy = PLUGIN_STATE.get("validation_policy")
+    mutator_id = "+".join(mutator_ids)
+
+    mutated_input = result.output if result is not None else None
 
     if mutated_input is not None:
         if not mutated_input == buffer:
             if 0 < len(mutated_input):
                 if len(mutated_input) < max_size:
-                    DATA[mutator_id]["successful_mut"] += 1
-
-                    # Check if well_formed
-                    well_formed = False
-                    try:
-                        xml_tree = etree.parse(io.BytesIO(mutated_input))
-                        DATA[mutator_id]["well_formed"] += 1
-                        well_formed = True
-                    except Exception as exp:
-                        logger.debug(
-                            "Mutated input from %s was not well_formed XML. %s.", mutator_id, exp
-                        )
-
-                    if well_formed:
-                        # Check if saml valid
-                        try:
-                            val_result = OneLogin_Saml2_XML.validate_xml(
-                                xml_tree.getroot(), "saml-schema-protocol-2.0.xsd"
-                            )
-                            if isinstance(val_result, etree._Element):
-                                DATA[mutator_id]["saml_valid"] += 1
-
-                        except Exception as exp:
-                            logger.debug(
-                                "Mutated input from %s was not valid SAML. %s.", mutator_id, exp
-                            )
+                    count_data(mutator_ids, "successful_mut")
+
+                    if policy.should_validate(mutator_ids[0]):
+                        analysis_pool = PLUGIN_STATE.get("analysis_pool")
+                        if analysis_pool.enabled:
+                            analysis_pool.submit(mutated_input, mutator_ids)
+                        else:
+                            validate_mutant(mutated_input, result.xml_tree, mutator_ids)
+                    else:
+                        policy.defer(mutated_input, mutator_ids)
                 else:
                     logger.info(
                         "Size of mutated input from mutator %s was bigger than max_size", mutator_id
@@ -465,88 +917,294 @@ def analyze_result(buffer, mutated_input, mutator_id, max_size):
         logger.info("Mutated input from mutator %s was None.", mutator_id)
         mutated_input = buffer
 
-    DATA[mutator_id]["percent_successful_mut"] = round(
-        DATA[mutator_id]["successful_mut"] / DATA[mutator_id]["execs"], 7
-    )
-    DATA[mutator_id]["percent_well_formed"] = round(
-        DATA[mutator_id]["well_formed"] / DATA[mutator_id]["execs"], 7
-    )
-    DATA[mutator_id]["percent_saml_valid"] = round(
-        DATA[mutator_id]["saml_valid"] / DATA[mutator_id]["execs"], 7
-    )
-    DATA[mutator_id]["percent_new_finds"] = round(
-        DATA[mutator_id]["new_finds"] / DATA[mutator_id]["execs"], 7
-    )
+    update_percentages(mutator_ids)
 
     return mutated_input
 
 
+def validate_mutant(mutated_input, xml_tree, mutator_ids) -> None:
+    """Check a successful mutant for well-formedness and SAML validity and count the results.
+
+    Args:
+        mutated_input (bytearray): the mutant
+        xml_tree (Optional[etree._ElementTree]): the tree of the mutant, if already known
+        mutator_ids (list): identifiers of the mutators that produced the mutant
+    """
+    logger = STATE.get("logger")
+    phase_timer = PLUGIN_STATE.get("phase_timer")
+    mutator_id = "+".join(mutator_ids)
+
+    count_data(mutator_ids, "validated")
+
+    # Check if well_formed
+    well_formed = False
+    phase_timer.start("well_formed")
+    try:
+        # The serialization of a tree is well-formed, no need to parse it again
+        if xml_tree is None:
+            xml_tree = etree.parse(io.BytesIO(mutated_input))
+        count_data(mutator_ids, "well_formed")
+        well_formed = True
+    except Exception as exp:
+        logger.debug("Mutated input from %s was not well_formed XML. %s.", mutator_id, exp)
+    phase_timer.stop("well_formed")
+
+    if well_formed:
+        # Check if saml valid
+        phase_timer.start("schema")
+        try:
+            if PLUGIN_STATE.get("validator").is_valid(xml_tree.getroot()):
+                count_data(mutator_ids, "saml_valid")
+
+        except Exception as exp:
+            logger.debug("Mutated input from %s was not valid SAML. %s.", mutator_id, exp)
+        phase_timer.stop("schema")
+
+
+def validate_deferred() -> None:
+    """Validate the mutants the validation policy deferred and update the statistics."""
+    deferred = PLUGIN_STATE.get("validation_policy").drain()
+    if not deferred:
+        return
+
+    STATE.get("logger").debug("Validating %d deferred mutants.", len(deferred))
+    mutator_ids = set()
+    for mutated_input, chain_ids in deferred:
+        validate_mutant(mutated_input, None, chain_ids)
+        mutator_ids.update(chain_ids)
+    update_percentages(mutator_ids)
+
+
+def collect_analysis() -> None:
+    """Merge the results of the analysis pool into the statistics."""
+    mutator_ids = set()
+    for chain_ids, well_formed, saml_valid in PLUGIN_STATE.get("analysis_pool").results():
+        count_data(chain_ids, "validated")
+        if well_formed:
+            count_data(chain_ids, "well_formed")
+        if saml_valid:
+            count_data(chain_ids, "saml_valid")
+        mutator_ids.update(chain_ids)
+    update_percentages(mutator_ids)
+
+
+def update_percentages(mutator_ids, data=None) -> None:
+    """Recompute the rates of the given mutators.
+
+    well_formed and saml_valid are only counted for validated mutants. Their rates are scaled
+    by the share of successful mutants that were validated, so they are estimates for all
+    executions. If every successful mutant is validated, they are exact.
+
+    Args:
+        mutator_ids (list): identifiers of the mutators
+        data (dict): the counters, DATA by default
+    """
+    data = DATA if data is None else data
+    for _mutator_id in mutator_ids:
+        _data = data[_mutator_id]
+        if not _data["execs"]:
+            continue
+        _data["percent_successful_mut"] = round(_data["successful_mut"] / _data["execs"], 7)
+        scale = 0
+        if _data["validated"]:
+            scale = _data["successful_mut"] / (_data["validated"] * _data["execs"])
+        _data["percent_well_formed"] = round(_data["well_formed"] * scale, 7)
+        _data["percent_saml_valid"] = round(_data["saml_valid"] * scale, 7)
+        _data["percent_new_finds"] = round(_data["new_finds"] / _data["execs"], 7)
+
+
+def sync_shared_stats() -> None:
+    """Publish the counters of this instance and add up the counters of all instances."""
+    shared_stats = PLUGIN_STATE.get("shared_stats")
+    shared_stats.publish(DATA)
+
+    evidence = PLUGIN_STATE.get("evidence")
+    others = shared_stats.others()
+    for identifier, counters in others.items():
+        # same keys as DATA, without the phase timings
+        merged = evidence.setdefault(
+            identifier, {key: 0 for key in DATA[identifier] if key != "phases"}
+        )
+        for counter in SHARED_COUNTERS:
+            merged[counter] = DATA[identifier][counter] + counters[counter]
+    update_percentages(others.keys(), evidence)
+
+
+def count_data(mutator_ids, counter) -> None:
+    """Increment the counter of all given mutators."""
+    for mutator_id in mutator_ids:
+        DATA[mutator_id][counter] += 1
+
+
 def handle_stage_change() -> None:
     logger = STATE.get("logger")
     logger.debug("stage_duration passed")
     STATE.update({"start_time": datetime.now()})
 
+    # the metrics need the validity rates of the whole stage
+    validate_deferred()
+    if PLUGIN_STATE.get("shared_stats") is not None:
+        sync_shared_stats()
+    evidence = PLUGIN_STATE.get("evidence")
+
     current_stage_duration: int = STATE.get("stage_duration")
 
     prob_dist = STATE.get("prob_dist")
+    new_stage_duration = current_stage_duration
 
+    evaluations = []
+    stage_durations = []
     for metric in PLUGIN_STATE.get("metrics").values():
-        logger.info("Applying metric")
+        logger.info("Applying metric %s", metric.identifier)
 
-        prob_dist = metric.evaluate(STATE, DATA)
-        new_stage_duration = metric.stage_duration(current_stage_duration, STATE, DATA)
+        evaluations.append((metric.evaluate(STATE, evidence), metric.weight))
+        stage_durations.append(metric.stage_duration(current_stage_duration, STATE, evidence))
+
+    if evaluations:
+        prob_dist = metric_combination.combine(evaluations, PLUGIN_STATE.get("metric_combination"))
+        # the metric that asks for the shortest stage decides
+        new_stage_duration = min(stage_durations)
+
+    scheduler = PLUGIN_STATE.get("scheduler")
+    if scheduler is not None:
+        # the scheduler chooses the mutators, its probabilities are only recorded
+        prob_dist = scheduler.probabilities()
 
     STATE.update({"prob_dist": prob_dist})
     STATE.update({"stage_duration": new_stage_duration})
+    PLUGIN_STATE.get("stats_sink").snapshot("stage_change", DATA, STATE)
 
 
 def backup() -> None:
+    """Write the statistics and checkpoint the state."""
+    stats_sink = PLUGIN_STATE.get("stats_sink")
+    stats_sink.snapshot("backup", DATA, STATE)
+    stats_sink.flush()
+    STATE.update({"last_backup": datetime.now()})
+    checkpoint()
+
+
+def checkpoint() -> None:
+    """Checkpoint DATA, STATE, the state of the random number generators and the sampling of
+    the validation policy. Plugins keep the rest of their state in DATA.
+
+    Only the snapshot is taken here, the checkpoint is written in the background.
+    """
     logger = STATE.get("logger")
-    logger.critical(json.dumps(DATA, indent=2))
-    logger.critical(STATE)
     logger.info("Try to backup state.")
-    backup_dir = os.getenv(
-        "BACKUP_DIR", str(pathlib.Path(__file__).parent.resolve().joinpath(".backup/"))
+
+    # every DATA entry is a section of its own, so deltas skip the unchanged ones
+    sections = {"DATA/" + key: value for key, value in DATA.items()}
+    sections.update(
+        {
+            "STATE": {key: value for key, value in STATE.items() if key not in TRANSIENT_STATE},
+            "RNG": rng_states(),
+            "VALIDATION_POLICY": PLUGIN_STATE.get("validation_policy").state(),
+        }
     )
     try:
-        with open(backup_dir + "/DATA.bak", "wb") as outp:  # Overwrites any existing file.
-            pickle.dump(DATA, outp, pickle.HIGHEST_PROTOCOL)
-        with open(backup_dir + "/STATE.bak", "wb") as outp:  # Overwrites any existing file.
-            pickle.dump(STATE, outp, pickle.HIGHEST_PROTOCOL)
-        STATE.update({"last_backup": datetime.now()})
+        PLUGIN_STATE.get("checkpointer").submit(sections)
     except Exception as exp:
         logger.critical(
             "Error while backing up state:  %s. Recover after crash likely not possible.", exp
         )
 
 
+def rng_streams() -> dict:
+    """Return the random number generators of the fuzzer and all plugins, by name."""
+    streams = {
+        "mutator_selection": PLUGIN_STATE.get("rng"),
+        "stacking": PLUGIN_STATE.get("stacking").rng,
+        "validation_policy": PLUGIN_STATE.get("validation_policy").rng,
+        "mutator/fallback_mutator": PLUGIN_STATE.get("fallback_mutator").rng,
+    }
+    for identifier, mutator in PLUGIN_STATE.get("mutators").items():
+        streams["mutator/" + identifier] = mutator.rng
+    scheduler = PLUGIN_STATE.get("scheduler")
+    if scheduler is not None:
+        streams["scheduler/" + scheduler.identifier] = scheduler.rng
+    return streams
+
+
+def rng_states() -> dict:
+    """Return the state of all random number generators, by name."""
+    states = {name: rng.getstate() for name, rng in rng_streams().items()}
+    # plugins that do not have their own generator yet use the global one
+    states.update({"random": random.getstate()})
+    return states
+
+
+def restore_rng_states(states: dict) -> None:
+    """Continue the random number generators from the given states. Generators of plugins that
+    were added since the checkpoint start from their seed."""
+    random.setstate(states["random"])
+    for name, rng in rng_streams().items():
+        if name in states:
+            rng.setstate(states[name])
+
+
 def restore() -> bool:
     print("Try restoring state...")
-    global DATA
-    global STATE
 
-    backup_dir = os.getenv(
-        "BACKUP_DIR", str(pathlib.Path(__file__).parent.resolve().joinpath(".backup/"))
-    )
     try:
-        with open(backup_dir + "/DATA.bak", "rb") as inp:  # Overwrites any existing file.
-            DATA = pickle.load(inp)
-        with open(backup_dir + "/STATE.bak", "rb") as inp:  # Overwrites any existing file.
-            STATE = pickle.load(inp)
-        if DATA and STATE:
-            random.seed(STATE.get("seed"))
-            init_logging(keep=True)
-            load_plugins()
-            etree.set_default_parser(PLUGIN_STATE.get("parser"))
-            logger = STATE.get("logger")
-            logger.info("DATA and STATE restored. Resume fuzzing...")
-            return True
-    except FileNotFoundError:
-        pass
+        sections = PLUGIN_STATE.get("checkpointer").load()
+    except Exception as exp:
+        print(f"Could not load checkpoint. {exp}.")
+        sections = None
+
+    if sections:
+        DATA.clear()
+        DATA.update(
+            {
+                key[len("DATA/") :]: value
+                for key, value in sections.items()
+                if key.startswith("DATA/")
+            }
+        )
+        STATE.update(sections["STATE"])
+        init_logging(keep=True)
+        load_plugins()
+        etree.set_default_parser(PLUGIN_STATE.get("parser"))
+        # the plugins seed the generators on init, continue where the campaign stopped instead
+        restore_rng_states(sections["RNG"])
+        # not in checkpoints of earlier versions
+        if "VALIDATION_POLICY" in sections:
+            PLUGIN_STATE.get("validation_policy").restore_state(sections["VALIDATION_POLICY"])
+        logger = STATE.get("logger")
+        logger.info("DATA and STATE restored. Resume fuzzing...")
+        return True
+
     print("No state to recover. Proceed with initialization.")
     return False
 
 
+def check_signature_repair(test_dir: pathlib.Path) -> None:
+    """Regression checks of the signature repair with the test key in tests/keys."""
+    from runtime.signature_repair import NSMAP
+
+    stats = {}
+    signature_repair = SignatureRepair(
+        key_file=str(test_dir.joinpath("keys/test-key.pem")),
+        cert_file=str(test_dir.joinpath("keys/test-cert.pem")),
+        parser=PLUGIN_STATE.get("parser"),
+        stats=stats,
+    )
+
+    # a reference that resolves to its own signature: the ID of the target copied to the
+    # signature, which is moved before the target
+    root = etree.fromstring(
+        test_dir.joinpath("input/default.xml").read_bytes(), PLUGIN_STATE.get("parser")
+    )
+    signature = root.find(".//ds:Signature", NSMAP)
+    signature.set("ID", signature.find(".//ds:Reference", NSMAP).get("URI")[1:])
+    signature.getparent().addprevious(signature)
+    signature_repair.repair(etree.tostring(root))
+    assert stats["unsupported"] == 1, f"Self-referencing signature not unsupported: {stats}"
+
+    signature_repair.repair(test_dir.joinpath("input/default.xml").read_bytes())
+    assert stats["unsupported"] == 1, f"Signature of default.xml not repaired: {stats}"
+
+
 if __name__ == "__main__":
 
     script_dir = pathlib.Path(__file__).parent
@@ -555,15 +1213,16 @@ if __name__ == "__main__":
     os.environ["CFG_DIR"] = str(test_dir.joinpath(".config/"))
     os.environ["INPUT_DIR"] = str(test_dir.joinpath("input/"))
     os.environ["STAGE_DURATION"] = "2"
+    # the optional modes (sampled validation, stacked mutations, combined metrics) only run with
+    # --modes, the default run keeps the behaviour without them
+    if "--modes" in sys.argv[1:]:
+        cfg_dir = test_dir.joinpath(".config/")
+        os.environ["VALIDATION_CFG_PATH"] = str(cfg_dir.joinpath("validation-sampled.yaml"))
+        os.environ["MUTATOR_CFG_PATH"] = str(cfg_dir.joinpath("mutators-stacked.yaml"))
+        os.environ["METRIC_CFG_PATH"] = str(cfg_dir.joinpath("metrics-combined.yaml"))
 
-    try:
-        os.remove(script_dir.joinpath(".backup/DATA.bak"))
-    except Exception:
-        pass
-    try:
-        os.remove(script_dir.joinpath(".backup/STATE.bak"))
-    except Exception:
-        pass
+    for checkpoint_file in script_dir.joinpath(".backup/").glob("checkpoint-*"):
+        checkpoint_file.unlink()
 
     init(time.time())
 
@@ -593,3 +1252,5 @@ if __name__ == "__main__":
                 _stats["percent_successful_mut"] == 1
             ), f"""Mutator {_mutator} failed. Check if this was an
                 implementation error or due to randomness / bad luck."""
+
+    check_signature_repair(test_dir)
@@ -0,0 +1,295 @@
+"""Micro-benchmark for the mutators and analyze_result.
+
+Runs every configured mutator (and the fallback mutator) on generated corpora of increasing
+size and depth and measures execs/sec, p50/p99 latency and allocated bytes per exec.
+Results are written to a JSON file, so runs of different commits can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --output after.json --compare before.json
+
+The configuration is pinned in tests/.config/benchmark/, independent of the test configuration.
+The output records it, --compare warns if the runs used different configurations.
+
+Runs offline, AFL++ is not required.
+"""
+
+import argparse
+import copy
+import hashlib
+import io
+import json
+import os
+import pathlib
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from lxml import etree
+
+SCRIPT_DIR = pathlib.Path(__file__).parent.resolve()
+TEST_DIR = SCRIPT_DIR.joinpath("tests/")
+CFG_DIR = TEST_DIR.joinpath(".config/benchmark/")
+
+SAML_NS = "urn:oasis:names:tc:SAML:2.0:assertion"
+BENCH_NS = "urn:xml-signature-mutator:benchmark"
+
+# name, approximate size in bytes, nesting depth of the additional element chain
+CORPORA = [
+    ("5kb", 5 * 1024, 0),
+    ("50kb", 50 * 1024, 0),
+    ("1mb", 1024 * 1024, 0),
+    ("deep", 5 * 1024, 200),
+]
+
+
+def generate_input(seed: bytes, size: int, depth: int) -> bytearray:
+    """Grow the seed to the given size by copying its assertion and add a nested element chain.
+
+    Args:
+        seed (bytes): SAML response used as template
+        size (int): approximate size of the result
+        depth (int): depth of the nested element chain, 0 for none
+
+    Returns:
+        bytearray: the generated input
+    """
+    xml_tree = etree.parse(io.BytesIO(seed))
+    root = xml_tree.getroot()
+    assertion = root.find(f"{{{SAML_NS}}}Assertion")
+
+    if depth:
+        parent = etree.SubElement(root, f"{{{BENCH_NS}}}Nested")
+        for level in range(depth - 1):
+            parent = etree.SubElement(parent, f"{{{BENCH_NS}}}Nested")
+            parent.text = f"level {level}"
+
+    serialized = etree.tostring(xml_tree)
+    if assertion is not None:
+        assertion_size = len(etree.tostring(assertion))
+        copies = max(0, (size - len(serialized)) // assertion_size)
+        for number in range(copies):
+            assertion_copy = copy.deepcopy(assertion)
+            assertion_copy.set("ID", f"_bench{number}")
+            root.append(assertion_copy)
+        serialized = etree.tostring(xml_tree)
+
+    return bytearray(serialized)
+
+
+def measure(call, iterations: int, setup=None) -> dict:
+    """Run call iterations times and return latency statistics. setup is not timed."""
+    latencies = []
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        start = time.perf_counter_ns()
+        call(*args)
+        latencies.append(time.perf_counter_ns() - start)
+
+    latencies.sort()
+    total_secs = sum(latencies) / 1e9
+    return {
+        "iterations": iterations,
+        "execs_per_sec": round(iterations / total_secs, 1) if total_secs else None,
+        "p50_us": round(statistics.median(latencies) / 1e3, 1),
+        "p99_us": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] / 1e3, 1),
+    }
+
+
+def measure_allocations(call, iterations: int, setup=None) -> int:
+    """Return the bytes allocated by the Python allocator per call (separate, slower pass)."""
+    allocated = 0
+    tracemalloc.start()
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        call(*args)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return allocated // iterations
+
+
+def configuration(afl_interface) -> dict:
+    """Return the settings that change the measured work and a digest of the config files."""
+    policy = afl_interface.PLUGIN_STATE.get("validation_policy")
+    stacking = afl_interface.PLUGIN_STATE.get("stacking")
+    digest = hashlib.blake2b(digest_size=16)
+    for path in sorted(CFG_DIR.glob("*.yaml")):
+        digest.update(path.name.encode("utf-8") + b"\0" + path.read_bytes())
+    return {
+        "cfg_dir": str(CFG_DIR.relative_to(SCRIPT_DIR)),
+        "digest": digest.hexdigest(),
+        "validation_mode": policy.mode,
+        "validation_sample_rate": policy.sample_rate,
+        "validation_pool": afl_interface.PLUGIN_STATE.get("analysis_pool").enabled,
+        "validation_tiers": list(afl_interface.PLUGIN_STATE.get("validator").tiers),
+        "stacking": stacking.enabled,
+        "max_stack_pow2": stacking.max_stack_pow2,
+        "metrics": sorted(afl_interface.PLUGIN_STATE.get("metrics")),
+        "metric_combination": afl_interface.PLUGIN_STATE.get("metric_combination"),
+    }
+
+
+def run(iterations: int, alloc_iterations: int, corpora: list) -> tuple:
+    # imported here, the environment has to be set up first
+    import afl_interface
+
+    afl_interface.init(0)
+    config = configuration(afl_interface)
+    mutators = dict(afl_interface.PLUGIN_STATE.get("mutators"))
+    mutators.update({"fallback_mutator": afl_interface.PLUGIN_STATE.get("fallback_mutator")})
+
+    seed = TEST_DIR.joinpath("input/default.xml").read_bytes()
+    max_size = 16 * 1024 * 1024
+    results = []
+
+    for corpus_name, size, depth in corpora:
+        buffer = generate_input(seed, size, depth)
+        pristine = etree.parse(io.BytesIO(buffer))
+        # fewer iterations for large inputs
+        corpus_iterations = max(10, iterations * 5 * 1024 // max(len(buffer), 5 * 1024))
+        corpus_alloc_iterations = max(2, alloc_iterations * 5 * 1024 // max(len(buffer), 5 * 1024))
+        print(
+            f"{corpus_name}: {len(buffer)} bytes, {corpus_iterations} iterations", file=sys.stderr
+        )
+
+        mutation_results = []
+        for mutator_id, mutator in mutators.items():
+
+            def setup(_mutator_id=mutator_id):
+                # analyze_result relates its counters to the execs
+                afl_interface.count_data([_mutator_id], "execs")
+                return (buffer, copy.deepcopy(pristine), b"", max_size)
+
+            def call(*args, _mutator=mutator):
+                mutation_results.append((_mutator.identifier, _mutator.mutate(*args)))
+
+            stats = measure(call, corpus_iterations, setup)
+            stats["alloc_bytes_per_exec"] = measure_allocations(
+                call, corpus_alloc_iterations, setup
+            )
+            stats.update({"target": mutator_id, "corpus": corpus_name, "input_size": len(buffer)})
+            results.append(stats)
+
+        # analyze_result over the results of all mutators
+        def analyze(mutator_id, result):
+            afl_interface.analyze_result(buffer, result, [mutator_id], max_size)
+
+        pending = iter(mutation_results)
+        stats = measure(analyze, len(mutation_results), lambda: next(pending))
+        pending = iter(mutation_results)
+        stats["alloc_bytes_per_exec"] = measure_allocations(
+            analyze, min(len(mutation_results), corpus_alloc_iterations), lambda: next(pending)
+        )
+        stats.update({"target": "analyze_result", "corpus": corpus_name, "input_size": len(buffer)})
+        results.append(stats)
+
+    return results, config
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=SCRIPT_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results: list, config: dict, baseline_path: pathlib.Path) -> None:
+    """Print the change of execs/sec and p99 latency relative to an earlier run."""
+    with open(baseline_path, encoding="utf-8") as file:
+        earlier = json.load(file)
+    baseline = {(item["target"], item["corpus"]): item for item in earlier["results"]}
+
+    earlier_config = earlier["meta"].get("config", {})
+    if earlier_config.get("digest") != config["digest"]:
+        changed = [
+            key for key in config if key != "digest" and earlier_config.get(key) != config[key]
+        ]
+        print(
+            f"Warning: {baseline_path} used a different configuration "
+            f"({', '.join(changed) or 'config files'}), the numbers are not comparable.",
+            file=sys.stderr,
+        )
+
+    print(f"{'target':<20}{'corpus':<8}{'execs/sec':>12}{'change':>9}{'p99 us':>12}{'change':>9}")
+    for item in results:
+        old = baseline.get((item["target"], item["corpus"]))
+        if old is None or not old["execs_per_sec"] or not old["p99_us"]:
+            continue
+        print(
+            f"{item['target']:<20}{item['corpus']:<8}"
+            f"{item['execs_per_sec']:>12}{item['execs_per_sec'] / old['execs_per_sec'] - 1:>+9.0%}"
+            f"{item['p99_us']:>12}{item['p99_us'] / old['p99_us'] - 1:>+9.0%}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", maxsplit=1)[0])
+    parser.add_argument("--output", default="benchmark_results.json", help="result file (JSON)")
+    parser.add_argument("--compare", help="result file of an earlier run to compare against")
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="iterations per mutator for the 5kb corpus"
+    )
+    parser.add_argument(
+        "--alloc-iterations", type=int, default=20, help="iterations of the allocation pass"
+    )
+    parser.add_argument(
+        "--corpora",
+        nargs="+",
+        choices=[name for name, _, _ in CORPORA],
+        default=[name for name, _, _ in CORPORA],
+    )
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="xml_signature_mutator-benchmark-")
+    os.environ["LOG_DIR"] = tmp_dir
+    os.environ["BACKUP_DIR"] = tmp_dir
+    os.environ["CFG_DIR"] = str(CFG_DIR)
+    # the pinned files, not the ones of the environment
+    for variable in ("MUTATOR_CFG_PATH", "METRIC_CFG_PATH", "VALIDATION_CFG_PATH"):
+        os.environ.pop(variable, None)
+    os.environ["INPUT_DIR"] = str(TEST_DIR.joinpath("input/"))
+    os.environ["DONT_RESTORE"] = "1"
+    sys.path.insert(0, str(SCRIPT_DIR))
+
+    results, config = run(
+        args.iterations,
+        args.alloc_iterations,
+        [corpus for corpus in CORPORA if corpus[0] in args.corpora],
+    )
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "meta": {
+                    "revision": git_revision(),
+                    "timestamp": datetime.now().isoformat(),
+                    "python": platform.python_version(),
+                    "lxml": etree.__version__,
+                    "host": platform.node(),
+                    "config": config,
+                },
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        compare(results, config, pathlib.Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,7 @@ class DummyMetric(BaseMetric):
 
         res = {}
 
-        for identifier, _ in data.items():
-            if identifier == "fallback_mutator":
-                continue
+        for identifier, _ in self._mutator_data(data):
             res.update({identifier: 1})
 
         return res
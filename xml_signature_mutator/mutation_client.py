@@ -0,0 +1,195 @@
+"""Thin AFL++ custom mutator that forwards every call to runtime.mutation_daemon.
+
+Use it instead of afl_interface, e.g., PYTHON_MODULE=mutation_client, after starting the
+daemon. It neither loads plugins nor parses XML, so it starts instantly.
+
+Mutants are requested in batches: after fuzz_count, the client knows how often AFL++ fuzzes
+the queue entry and fetches up to MUTATION_DAEMON_BATCH mutants per request. The mutators do
+not use the additional buffer, so all mutants of a batch are derived from the queue entry.
+
+If the daemon fails a request, fuzz returns the input unchanged and introspection reports
+nothing, so AFL++ keeps fuzzing. Other failures, e.g., a lost connection, are raised.
+
+Environment:
+    MUTATION_DAEMON_SOCKET: path of the socket of the daemon
+    MUTATION_DAEMON_BATCH: maximal number of mutants per request, default 8
+"""
+
+import logging
+import mmap
+import os
+import pathlib
+import socket
+import tempfile
+from collections import deque
+
+from runtime.mutation_daemon import (
+    DEFAULT_SOCKET,
+    SHM_DIR,
+    SHM_PREFIX,
+    receive_message,
+    send_message,
+)
+
+STATE = {
+    "connection": None,
+    "shared_buffer": None,
+    "shared_path": None,
+    "batch": 8,
+    "remaining": 0,
+    "input": None,
+    "max_size": None,
+    "mutants": deque(),
+    "last_mutation": None,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class DaemonError(RuntimeError):
+    """The daemon failed to handle a request."""
+
+
+def init(seed: bytearray) -> None:
+    """Called at startup. The daemon is seeded on its own, seed is not used."""
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    socket_path = os.getenv("MUTATION_DAEMON_SOCKET", DEFAULT_SOCKET)
+    try:
+        connection.connect(socket_path)
+    except OSError as exp:
+        raise ConnectionError(f"Mutation daemon is not running at {socket_path}. {exp}") from exp
+
+    file_descriptor, shared_path = tempfile.mkstemp(dir=SHM_DIR, prefix=SHM_PREFIX)
+    os.close(file_descriptor)
+
+    STATE.update(
+        {
+            "connection": connection,
+            "shared_path": pathlib.Path(shared_path),
+            "batch": max(1, int(os.getenv("MUTATION_DAEMON_BATCH", "8"))),
+        }
+    )
+
+
+def _request(message: dict):
+    send_message(STATE.get("connection"), message)
+    reply = receive_message(STATE.get("connection"))
+    if reply is None:
+        raise ConnectionError("Mutation daemon closed the connection")
+    if "error" in reply:
+        raise DaemonError(f"Mutation daemon failed: {reply['error']}")
+    return reply["result"]
+
+
+def _share(buffer: bytearray, size: int) -> None:
+    """Write buffer to the start of the shared buffer. Grows it to at least size bytes."""
+    shared_buffer = STATE.get("shared_buffer")
+    if shared_buffer is None or len(shared_buffer) < size:
+        if shared_buffer is not None:
+            shared_buffer.close()
+        # sparse, only the pages that are written take memory
+        with open(STATE.get("shared_path"), "r+b") as file:
+            file.truncate(size)
+            shared_buffer = mmap.mmap(file.fileno(), size)
+        STATE.update({"shared_buffer": shared_buffer})
+        _request({"op": "hello", "shm": str(STATE.get("shared_path")), "size": size})
+    shared_buffer[: len(buffer)] = buffer
+
+
+def fuzz(buffer: bytearray, additional_buffer: bytearray, max_size: int) -> bytearray:
+    """Called for every fuzzing operation. Returns the next mutant of the batch and fetches a
+    new batch, if the batch is empty or was derived from another input."""
+    mutants = STATE.get("mutants")
+    if not mutants or STATE.get("input") != buffer or STATE.get("max_size") != max_size:
+        batch = max(1, min(STATE.get("batch"), STATE.get("remaining")))
+        try:
+            _share(buffer, len(buffer) + batch * max_size)
+            replies = _request(
+                {"op": "fuzz", "length": len(buffer), "max_size": max_size, "batch": batch}
+            )
+        except DaemonError as exp:
+            logger.error("Returning the input unchanged. %s", exp)
+            mutants.clear()
+            STATE.update({"input": None, "last_mutation": None})
+            STATE.update({"remaining": max(0, STATE.get("remaining") - 1)})
+            return buffer[:max_size]
+        shared_buffer = STATE.get("shared_buffer")
+        mutants.clear()
+        mutants.extend(
+            (bytearray(shared_buffer[offset : offset + length]), mutation)
+            for offset, length, mutation in replies
+        )
+        STATE.update({"input": bytes(buffer), "max_size": max_size})
+
+    mutated, mutation = mutants.popleft()
+    STATE.update({"last_mutation": mutation})
+    STATE.update({"remaining": max(0, STATE.get("remaining") - 1)})
+    return mutated
+
+
+def describe(max_description_length: int) -> bytearray:
+    """Returns name used by AFL to name input"""
+    if STATE.get("last_mutation") is None:
+        # the daemon failed, the input was returned unchanged
+        return bytearray()
+    description = STATE.get("last_mutation")["last_mutation"]
+    return description.encode(encoding="utf-8")[:max_description_length]
+
+
+def introspection() -> bytearray:
+    """Called by AFL++ when an input triggered a new path, crash or timeout"""
+    if STATE.get("last_mutation") is None:
+        return bytearray()
+    try:
+        result = _request({"op": "introspection", "mutation": STATE.get("last_mutation")})
+    except DaemonError as exp:
+        logger.error("No introspection of the last mutation. %s", exp)
+        return bytearray()
+    return bytearray(result, encoding="utf-8")
+
+
+def fuzz_count(buffer: bytearray) -> int:
+    """Called by AFL++ once per queue entry before it is fuzzed."""
+    _share(buffer, len(buffer))
+    count = _request({"op": "fuzz_count", "length": len(buffer)})
+    # mutants of the previous entry are not used anymore
+    STATE.get("mutants").clear()
+    STATE.update({"remaining": count})
+    return count
+
+
+def init_trim(buffer: bytearray) -> int:
+    """Called by AFL++ once per queue entry before it is trimmed."""
+    _share(buffer, len(buffer))
+    return _request({"op": "init_trim", "length": len(buffer)})
+
+
+def trim() -> bytearray:
+    """Called by AFL++ for every trimming step. Steps only shrink the entry, it fits."""
+    length = _request({"op": "trim"})
+    return bytearray(STATE.get("shared_buffer")[:length])
+
+
+def post_trim(success: bool) -> int:
+    """Called by AFL++ after every trimming step."""
+    return _request({"op": "post_trim", "success": bool(success)})
+
+
+def queue_new_entry(filename_new_queue: str, filename_orig_queue: str) -> bool:
+    """Called by AFL++ after a new entry was added to the queue."""
+    return _request(
+        {"op": "queue_new_entry", "new": filename_new_queue, "orig": filename_orig_queue}
+    )
+
+
+def queue_get(filename: str) -> bool:
+    """Called by AFL++ before a queue entry is fuzzed."""
+    return _request({"op": "queue_get", "filename": filename})
+
+
+def deinit() -> None:
+    """Called after fuzzing stops. The daemon keeps running for the other instances."""
+    if STATE.get("shared_buffer") is not None:
+        STATE.get("shared_buffer").close()
+    STATE.get("connection").close()
+    STATE.get("shared_path").unlink(missing_ok=True)
@@ -1,6 +1,5 @@
 import io
 import logging
-import random
 from dataclasses import dataclass
 
 from lxml import etree
@@ -13,23 +12,17 @@ from plugin_base.base_mutator import BaseMutator
 class ChangeReference(BaseMutator):
     logger = logging.getLogger(__name__)
 
-    def mutate(
-        self,
-        input_xml: bytearray,
-        xml_tree: etree._Element,
-        additional_buffer: bytearray,
-        max_size: int,
-    ) -> bytearray:
+    def mutate_tree(self, xml_tree: etree._ElementTree) -> bool:
 
         # find reference element
         prefix_map = {"ds": "http://www.w3.org/2000/09/xmldsig#"}
         references = xml_tree.findall(".//ds:Reference", prefix_map)
 
         if references:
-            reference = random.choice(references)
+            reference = self.rng.choice(references)
         else:
             self.logger.debug("Found no Reference element in document. Skipping mutation step,")
-            return input_xml
+            return False
 
         # find all IDs
         list_of_ids = []
@@ -41,17 +34,17 @@ class ChangeReference(BaseMutator):
         if reference.attrib.get("URI") in list_of_ids:
             list_of_ids.remove(reference.attrib.get("URI"))
         if list_of_ids:
-            xml_id = random.choice(list_of_ids)
+            xml_id = self.rng.choice(list_of_ids)
         else:
             self.logger.debug("Found no ID attribute in document. Skipping mutation step,")
-            return input_xml
+            return False
 
         reference.attrib.update({"URI": xml_id})
 
         # replace attribute of Reference
         self.logger.debug("Changing reference of element %s to %s.", reference, xml_id)
 
-        return bytearray(self._serialize_xml(xml_tree), encoding="utf-8")
+        return True
 
 
 def register() -> None:
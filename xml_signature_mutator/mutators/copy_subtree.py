@@ -13,13 +13,7 @@ from plugin_base.base_mutator import BaseMutator
 class CopySubtree(BaseMutator):
     logger = logging.getLogger(__name__)
 
-    def mutate(
-        self,
-        input_xml: bytearray,
-        xml_tree: etree._Element,
-        additional_buffer: bytearray,
-        max_size: int,
-    ) -> bytearray:
+    def mutate_tree(self, xml_tree: etree._ElementTree) -> bool:
 
         # Select a node to modify (but the root one)
         found: bool = False
@@ -35,14 +29,15 @@ class CopySubtree(BaseMutator):
 
         if not found:
             self.logger.debug("Did not find subtrees to copy. Skipping mutation step.")
-            return input_xml
+            return False
 
         tree_copy = copy.deepcopy(tree_to_copy)
         new_parent.append(tree_copy)
+        self._element_index(xml_tree).add(tree_copy)
 
         self.logger.debug("Copying subtree %s to %s.", tree_to_copy, new_parent)
 
-        return bytearray(self._serialize_xml(xml_tree), encoding="utf-8")
+        return True
 
 
 def register() -> None:
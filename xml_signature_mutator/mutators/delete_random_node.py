@@ -1,8 +1,6 @@
 import io
 import logging
-import re
 from dataclasses import dataclass
-from xmlrpc.client import Boolean
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
@@ -12,18 +10,10 @@ from plugin_base.base_mutator import BaseMutator
 
 @dataclass
 class DeleteRandomNode(BaseMutator):
-    delete_children: Boolean = False
+    delete_children: bool = False
     logger = logging.getLogger(__name__)
-    openclose_reg = re.compile(r"<delete_this_element.*>([^$]*)</delete_this_element[^>]*>")
-    selfclose_reg = re.compile(r"<delete_this_element.*/>")
 
-    def mutate(
-        self,
-        input_xml: bytearray,
-        xml_tree: etree._Element,
-        additional_buffer: bytearray,
-        max_size: int,
-    ) -> bytearray:
+    def mutate_tree(self, xml_tree: etree._ElementTree) -> bool:
 
         # Select a node to modify (but the root one)
         _, rand_elem = self._pick_element(xml_tree, exclude_root_node=True)
@@ -33,44 +23,36 @@ class DeleteRandomNode(BaseMutator):
         # Is the document deep enough?
         if rand_elem is None:
             self.logger.debug("There is no element to delete")
-            return input_xml
+            return False
         self.logger.debug("Deleting element %s from input.", rand_elem)
 
-        # If we delete the node but keep the children, safe children first
-        if not self.delete_children:
-            try:
-                # Get position of rand_elem in list of parent's children
-                index = rand_elem.getparent().getchildren().index(rand_elem)
-                # Move all children of rand_element to parent
-                # Keep order of elements; hence, insert in reverse order
-                if len(rand_elem.getchildren()) > 0:
-                    children = rand_elem.getchildren()
-                    children.reverse()
-                    for child in children:
-                        rand_elem.getparent().insert(index, child)
-
-            except Exception as exp:
-                self.logger.debug(
-                    "Error keeping children of deleted note. Abort mutation. %s.", exp
-                )
-
-        # Remove the node
-        rand_elem.tag = "delete_this_element"
-        xml_tree_str = self._serialize_xml(xml_tree)
+        parent = rand_elem.getparent()
 
-        xml_tree_str = re.sub(self.openclose_reg, "", xml_tree_str)
-        xml_tree_str = re.sub(self.selfclose_reg, "", xml_tree_str)
-
-        xml_tree = etree.parse(
-            io.BytesIO(
-                bytearray(
-                    xml_tree_str,
-                    encoding="utf-8",
-                )
-            )
-        )
-
-        return bytearray(self._serialize_xml(xml_tree), encoding="utf-8")
+        # If we delete the node but keep the children, move children (with their tails) to
+        # the parent first. Keep order of elements; hence, insert them at the position of
+        # rand_elem, one after another.
+        if not self.delete_children:
+            index = parent.index(rand_elem)
+            for offset, child in enumerate(list(rand_elem)):
+                parent.insert(index + offset, child)
+
+        elements = self._element_index(xml_tree)
+
+        # Remove the node and its text, but keep the text following it. Tails are not indexed,
+        # the text of the parent is (HAS_TEXT).
+        tail = rand_elem.tail
+        if tail:
+            previous = rand_elem.getprevious()
+            if previous is not None:
+                previous.tail = (previous.tail or "") + tail
+            else:
+                parent.text = (parent.text or "") + tail
+                elements.update(parent)
+        parent.remove(rand_elem)
+
+        elements.remove(rand_elem, with_children=self.delete_children)
+
+        return True
 
 
 def register() -> None:
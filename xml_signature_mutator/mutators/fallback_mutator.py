@@ -1,46 +1,30 @@
 import copy
 import io
 import logging
-import os
-import pathlib
-import random
-import re
 from dataclasses import dataclass, field
+from typing import Optional
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
-from plugin_base import plugin_util
+from plugin_base import plugin_util, seed_corpus
 from plugin_base.base_mutator import BaseMutator
+from plugin_base.input_profile import BETWEEN_ELEM_REG, OPENTAG_REG, InputProfile
+from plugin_base.mutation_result import MutationResult
 
 
 @dataclass
 class FallbackMutator(BaseMutator):
     logger = logging.getLogger(__name__)
-    init_trees: list = field(default_factory=list)
-    between_elem_reg = re.compile(r">([^$]){0,2}<")
-    opentag_reg = re.compile(r"<[^/][\w:.-]*[^>]*>")
+    tree_level = False
+    fragments: tuple = field(default_factory=tuple)
+    between_elem_reg = BETWEEN_ELEM_REG
+    opentag_reg = OPENTAG_REG
 
     def init(self, seed: bytearray) -> None:
         """Initialized this mutator. Called once per mutation."""
-        random.seed(str(seed))
-
-        input_dir = pathlib.Path(os.getenv("INPUT_DIR", None))
-        if input_dir:
-            for file in input_dir.glob("*.xml"):
-                with file.open("r+b") as file:
-                    self.logger.debug('Loading initial input "%s".', file.name)
-                    input_xml = bytearray(file.read())
-
-                    try:
-                        xml_tree = etree.parse(io.BytesIO(input_xml))
-                        self.init_trees.append(xml_tree)
-
-                    except XMLSyntaxError as exp:
-                        self.logger.debug(
-                            "Could not get elements from input %s due to parser exception: %s.",
-                            file,
-                            exp,
-                        )
+        super().init(seed)
+
+        self.fragments = seed_corpus.get_corpus().fragments
 
     def mutate(
         self,
@@ -48,19 +32,28 @@ class FallbackMutator(BaseMutator):
         xml_tree: etree._Element,
         additional_buffer: bytearray,
         max_size: int,
-    ) -> bytearray:
+        profile: Optional[InputProfile] = None,
+    ) -> MutationResult:
+        """Applies a string-level mutation. If the profile of the input is given, its offset
+        tables are used instead of searching the input again."""
+
+        open_tag_spans = None
+        between_elem_offsets = None
+        if profile is not None:
+            open_tag_spans = list(profile.open_tag_spans)
+            between_elem_offsets = profile.between_elem_offsets
 
         xml_tree_str = ""
         try:
             xml_tree_str = input_xml.decode("utf-8")
         except Exception as exp:
             self.logger.info("Exception while decoding input: %s. Use bitflip mutator.", exp)
-            return self.flip_bit(input_xml)
+            return MutationResult(self.flip_bit(input_xml))
 
         if len(xml_tree_str) < 2:
             choice = 5
         else:
-            choice = random.choice([0, 1, 2, 3, 4, 5, 6])
+            choice = self.rng.choice([0, 1, 2, 3, 4, 5, 6])
 
         try:
             # Insert CDATA anywhere
@@ -81,25 +74,25 @@ class FallbackMutator(BaseMutator):
 
             # Delete whole subtree
             elif choice == 4:
-                result = self.delete_element(xml_tree_str)
+                result = self.delete_element(xml_tree_str, open_tag_spans)
 
             # Add random element from initial set
             elif choice == 5:
-                result = self.add_random_element(xml_tree_str)
+                result = self.add_random_element(xml_tree_str, between_elem_offsets)
 
             # Flip random bit in input
             elif choice == 6:
                 result = self.flip_bit(input_xml)
-                return result
+                return MutationResult(result)
 
         except Exception as exp:
             self.logger.critical("Default mutator failed with exception %s.", exp)
-            return None
+            return MutationResult(None)
 
-        return bytearray(result.encode("utf-8"))
+        return MutationResult(bytearray(result.encode("utf-8")))
 
     def insert_cdata(self, xml_tree_str) -> str:
-        indices = random.sample(range(0, len(xml_tree_str)), 2)
+        indices = self.rng.sample(range(0, len(xml_tree_str)), 2)
         indices.sort()
         xml_tree_str = (
             xml_tree_str[: indices[0]]
@@ -111,7 +104,7 @@ class FallbackMutator(BaseMutator):
         return xml_tree_str
 
     def insert_comment(self, xml_tree_str) -> str:
-        indices = random.sample(range(0, len(xml_tree_str)), 2)
+        indices = self.rng.sample(range(0, len(xml_tree_str)), 2)
         indices.sort()
         xml_tree_str = (
             xml_tree_str[: indices[0]]
@@ -123,26 +116,29 @@ class FallbackMutator(BaseMutator):
         return xml_tree_str
 
     def insert_special_char(self, xml_tree_str) -> str:
-        index = random.randint(0, len(xml_tree_str) - 1)
+        index = self.rng.randint(0, len(xml_tree_str) - 1)
         xml_tree_str = (
-            xml_tree_str[:index] + random.choice(["<", ">", "&", "'", '"']) + xml_tree_str[index:]
+            xml_tree_str[:index] + self.rng.choice(["<", ">", "&", "'", '"']) + xml_tree_str[index:]
         )
         return xml_tree_str
 
     def delete_random(self, xml_tree_str) -> str:
-        indices = random.sample(range(0, len(xml_tree_str)), 2)
+        indices = self.rng.sample(range(0, len(xml_tree_str)), 2)
         indices.sort()
         xml_tree_str = xml_tree_str[: indices[0]] + xml_tree_str[indices[1] :]
         return xml_tree_str
 
-    def delete_element(self, xml_tree_str) -> str:
+    def delete_element(self, xml_tree_str, open_tag_spans=None) -> str:
         # super ugly... "parsing" XML with regex
-        # find all opening tags
-        indices = [(m.start(), m.end()) for m in self.opentag_reg.finditer(xml_tree_str)]
+        # find all opening tags, if not known from the profile
+        if open_tag_spans is None:
+            indices = [(m.start(), m.end()) for m in self.opentag_reg.finditer(xml_tree_str)]
+        else:
+            indices = open_tag_spans
 
         # start at element 2 to not remove whole element
         try:
-            element_indicies = random.randint(1, len(indices) - 1)
+            element_indicies = self.rng.randint(1, len(indices) - 1)
         # No element found, delete random part
         except Exception:
             return self.delete_random(xml_tree_str)
@@ -174,33 +170,33 @@ class FallbackMutator(BaseMutator):
 
         return result
 
-    def add_random_element(self, xml_tree_str) -> str:
+    def add_random_element(self, xml_tree_str, between_elem_offsets=None) -> str:
 
-        init_tree_copy = copy.deepcopy(self.init_trees)
-        selected_tree = random.choice(init_tree_copy)
-        _, new_child = self._pick_element(selected_tree, exclude_root_node=False)
-        if new_child is None:
+        if not self.fragments:
             self.logger.debug("Did not find element.")
             return xml_tree_str
-        new_child_str = self._serialize_xml(new_child)
+        new_child_str = self.rng.choice(self.fragments).serialized
 
         if len(xml_tree_str) == 0:
             return new_child_str
 
-        indices = [m.start() for m in self.between_elem_reg.finditer(xml_tree_str)]
+        if between_elem_offsets is None:
+            indices = [m.start() for m in self.between_elem_reg.finditer(xml_tree_str)]
+        else:
+            indices = between_elem_offsets
         try:
-            index = random.choice(indices) + 1
+            index = self.rng.choice(indices) + 1
         except Exception as exp:
             self.logger.debug("No element found in document. Insert at random place. %s.", exp)
-            index = random.randint(0, len(xml_tree_str) - 1)
+            index = self.rng.randint(0, len(xml_tree_str) - 1)
 
         xml_tree_str = xml_tree_str[:index] + new_child_str + xml_tree_str[index:]
         return xml_tree_str
 
     def flip_bit(self, input_xml) -> str:
         _input_xml = copy.deepcopy(input_xml)
-        index = random.randint(0, len(_input_xml) - 1)
-        _input_xml[index] ^= random.randint(1, 255)
+        index = self.rng.randint(0, len(_input_xml) - 1)
+        _input_xml[index] ^= self.rng.randint(1, 255)
         return _input_xml
 
 
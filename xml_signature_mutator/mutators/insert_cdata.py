@@ -1,17 +1,18 @@
 import io
 import logging
-import random
 from dataclasses import dataclass
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
-from plugin_base import plugin_util
+from plugin_base import element_index, plugin_util
 from plugin_base.base_mutator import BaseMutator
+from plugin_base.mutation_result import MutationResult
 
 
 @dataclass
 class InsertCDATA(BaseMutator):
     logger = logging.getLogger(__name__)
+    tree_level = False
 
     def mutate(
         self,
@@ -19,22 +20,19 @@ class InsertCDATA(BaseMutator):
         xml_tree: etree._Element,
         additional_buffer: bytearray,
         max_size: int,
-    ) -> bytearray:
+    ) -> MutationResult:
 
-        found: bool = False
-        for _ in range(0, 20):
-            # Select node to insert cdata into
-            _, element = self._pick_element(xml_tree, exclude_root_node=False)
-            if element is not None and element.text is not None and len(element.text.strip()) > 0:
-                self.logger.debug("Found element to insert CDATA into.")
-                found = True
-                break
+        # Select node to insert cdata into
+        _, element = self._pick_element(xml_tree, category=element_index.HAS_TEXT)
+        found: bool = element is not None
+        if found:
+            self.logger.debug("Found element to insert CDATA into.")
 
         self.logger.debug("Inserting CDATA into element %s.", element)
 
-        if random.choice((True, False)) or not found or len(element.text) < 1:
+        if self.rng.choice((True, False)) or not found or len(element.text) < 1:
             xml_tree_str = self._serialize_xml(xml_tree)
-            indices = random.sample(range(0, len(xml_tree_str)), 2)
+            indices = self.rng.sample(range(0, len(xml_tree_str)), 2)
             indices.sort()
             xml_tree_str = (
                 xml_tree_str[: indices[0]]
@@ -45,7 +43,7 @@ class InsertCDATA(BaseMutator):
             )
         # insert empty CDATA
         else:
-            index = random.randrange(0, len(element.text))
+            index = self.rng.randrange(0, len(element.text))
             element.text = (
                 element.text[:index]
                 + "place_start_cdata_here"
@@ -60,7 +58,7 @@ class InsertCDATA(BaseMutator):
 
         self.logger.debug("Inserting CDATA into element %s.", element)
 
-        return bytearray(xml_tree_str.encode("utf-8"))
+        return MutationResult(bytearray(xml_tree_str.encode("utf-8")))
 
 
 def register() -> None:
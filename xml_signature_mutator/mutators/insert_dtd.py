@@ -1,19 +1,20 @@
 import io
 import logging
-import random
 import string
 import time
 from dataclasses import dataclass
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
-from plugin_base import plugin_util
+from plugin_base import element_index, plugin_util
 from plugin_base.base_mutator import BaseMutator
+from plugin_base.mutation_result import MutationResult
 
 
 @dataclass
 class InsertDTD(BaseMutator):
     logger = logging.getLogger(__name__)
+    tree_level = False
 
     def mutate(
         self,
@@ -21,20 +22,17 @@ class InsertDTD(BaseMutator):
         xml_tree: etree._Element,
         additional_buffer: bytearray,
         max_size: int,
-    ) -> bytearray:
+    ) -> MutationResult:
 
-        found: bool = False
-        for _ in range(0, 20):
-            # Select node to insert dtd into
-            _, element = self._pick_element(xml_tree, exclude_root_node=False)
-            if element is not None and element.text is not None and len(element.text.strip()) > 0:
-                self.logger.debug("Found element to insert dtd into.")
-                found = True
-                break
+        # Select node to insert dtd into
+        _, element = self._pick_element(xml_tree, category=element_index.HAS_TEXT)
+        found: bool = element is not None
+        if found:
+            self.logger.debug("Found element to insert dtd into.")
 
         self.logger.debug("Inserting dtd into element %s.", element)
 
-        _entity = "".join(random.choices(string.ascii_lowercase, k=10))
+        _entity = "".join(self.rng.choices(string.ascii_lowercase, k=10))
 
         xml_tree_str = self._serialize_xml(xml_tree)
 
@@ -44,10 +42,10 @@ class InsertDTD(BaseMutator):
             doc_type, xml_tree_str = xml_tree_str.split("]>", maxsplit=1)
 
         # random DTD anywhere
-        if random.choice((True, False)) or not found or len(element.text) < 1:
+        if self.rng.choice((True, False)) or not found or len(element.text) < 1:
 
             _content = ""
-            indices = random.sample(range(0, len(xml_tree_str)), 2)
+            indices = self.rng.sample(range(0, len(xml_tree_str)), 2)
             indices.sort()
             _content = xml_tree_str[indices[0] : indices[1]]
             xml_tree_str = (
@@ -65,7 +63,7 @@ class InsertDTD(BaseMutator):
         # replace no text, only empty DTD
         else:
             _content = ""
-            index = random.randrange(0, len(element.text))
+            index = self.rng.randrange(0, len(element.text))
             element.text = (
                 element.text[:index]
                 + "place_start_entity_here"
@@ -91,7 +89,7 @@ class InsertDTD(BaseMutator):
 
         xml_tree_str = doc_type + xml_tree_str
 
-        return bytearray(xml_tree_str.encode("utf-8"))
+        return MutationResult(bytearray(xml_tree_str.encode("utf-8")))
 
 
 def register() -> None:
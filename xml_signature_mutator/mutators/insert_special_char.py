@@ -1,19 +1,20 @@
 import io
 import logging
-import random
-from ast import List
 from dataclasses import dataclass, field
+from typing import List
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
 from plugin_base import plugin_util
 from plugin_base.base_mutator import BaseMutator
+from plugin_base.mutation_result import MutationResult
 
 
 @dataclass
 class InsertSpecialChar(BaseMutator):
     special_chars: List = field(default_factory=lambda: ["<", ">", "&", "'", '"'])
     logger = logging.getLogger(__name__)
+    tree_level = False
 
     def mutate(
         self,
@@ -21,17 +22,17 @@ class InsertSpecialChar(BaseMutator):
         xml_tree: etree._Element,
         additional_buffer: bytearray,
         max_size: int,
-    ) -> bytearray:
+    ) -> MutationResult:
 
         xml_tree_str = self._serialize_xml(xml_tree)
 
-        index = random.randrange(0, len(xml_tree_str))
+        index = self.rng.randrange(0, len(xml_tree_str))
 
         xml_tree_str = (
-            xml_tree_str[:index] + random.choice(self.special_chars) + xml_tree_str[index:]
+            xml_tree_str[:index] + self.rng.choice(self.special_chars) + xml_tree_str[index:]
         )
 
-        return bytearray(xml_tree_str.encode("utf-8"))
+        return MutationResult(bytearray(xml_tree_str.encode("utf-8")))
 
 
 def register() -> None:
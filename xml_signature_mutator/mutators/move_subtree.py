@@ -12,13 +12,7 @@ from plugin_base.base_mutator import BaseMutator
 class MoveSubtree(BaseMutator):
     logger = logging.getLogger(__name__)
 
-    def mutate(
-        self,
-        input_xml: bytearray,
-        xml_tree: etree._Element,
-        additional_buffer: bytearray,
-        max_size: int,
-    ) -> bytearray:
+    def mutate_tree(self, xml_tree: etree._ElementTree) -> bool:
 
         found: bool = False
         for _ in range(0, 20):
@@ -35,14 +29,14 @@ class MoveSubtree(BaseMutator):
             self.logger.debug(
                 "Did not find subtree and/or place to move it to. Skipping mutation step."
             )
-            return input_xml
+            return False
 
         self.logger.debug("Moving subtrees %s to %s from input.", tree_to_move, new_parent)
 
         tree_to_move.getparent().remove(tree_to_move)
         new_parent.append(tree_to_move)
 
-        return bytearray(self._serialize_xml(xml_tree), encoding="utf-8")
+        return True
 
 
 def register() -> None:
@@ -1,6 +1,5 @@
 import io
 import logging
-import random
 import string
 from dataclasses import dataclass
 
@@ -14,27 +13,22 @@ from plugin_base.base_mutator import BaseMutator
 class RandomizeContent(BaseMutator):
     logger = logging.getLogger(__name__)
 
-    def mutate(
-        self,
-        input_xml: bytearray,
-        xml_tree: etree._Element,
-        additional_buffer: bytearray,
-        max_size: int,
-    ) -> bytearray:
+    def mutate_tree(self, xml_tree: etree._ElementTree) -> bool:
 
         # Select node to insert comment into
         _, element = self._pick_element(xml_tree, exclude_root_node=False)
 
         if element is None:
             self.logger.debug("Did not find element.")
-            return input_xml
+            return False
 
         self.logger.debug("Randomizing content of element %s.", element)
 
-        length = random.randint(1, 500)
-        element.text = "".join(random.choices(string.ascii_letters + string.digits, k=length))
+        length = self.rng.randint(1, 500)
+        element.text = "".join(self.rng.choices(string.ascii_letters + string.digits, k=length))
+        self._element_index(xml_tree).update(element)
 
-        return bytearray(self._serialize_xml(xml_tree), encoding="utf-8")
+        return True
 
 
 def register() -> None:
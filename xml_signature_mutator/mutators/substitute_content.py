@@ -1,77 +1,60 @@
 import io
 import logging
-import os
-import pathlib
-import random
 from dataclasses import dataclass, field
 
 from lxml import etree
 from lxml.etree import XMLSyntaxError
-from plugin_base import plugin_util
+from plugin_base import plugin_util, seed_corpus
 from plugin_base.base_mutator import BaseMutator
 
 
 @dataclass
 class SubstituteContent(BaseMutator):
     logger = logging.getLogger(__name__)
-    contents: set = field(default_factory=set)
+    contents: tuple = field(default_factory=tuple)
+    extra_contents: tuple = field(default_factory=tuple)
 
     def init(self, seed: bytearray) -> None:
         """Initialized this mutator. Called once per mutation."""
-        random.seed(str(seed))
+        super().init(seed)
+
+        # the pool may be a shared store, it is not copied
+        self.contents = seed_corpus.get_corpus().contents
 
         # add content that should always be tested
-        self.contents.add("")
-        self.contents.add("\n")
-
-        input_dir = pathlib.Path(os.getenv("INPUT_DIR", None))
-        if input_dir:
-            for file in input_dir.glob("*.xml"):
-                with file.open("r+b") as file:
-                    self.logger.debug('Loading initial input "%s".', file.name)
-                    input_xml = bytearray(file.read())
-
-                    try:
-                        xml_tree = etree.parse(io.BytesIO(input_xml))
-
-                        for element in xml_tree.getroot().iterdescendants():
-                            if element.text:
-                                self.contents.add(element.text.strip())
-
-                    except XMLSyntaxError as exp:
-                        self.logger.debug(
-                            "Could not get elements from input %s due to parser exception: %s.",
-                            file,
-                            exp,
-                        )
-
-    def mutate(
-        self,
-        input_xml: bytearray,
-        xml_tree: etree._Element,
-        additional_buffer: bytearray,
-        max_size: int,
-    ) -> bytearray:
+        self.extra_contents = tuple(
+            content for content in ("", "\n") if content not in self.contents
+        )
+
+    def mutate_tree(self, xml_tree: etree._ElementTree) -> bool:
 
         # Select node to insert comment into
         _, element = self._pick_element(xml_tree, exclude_root_node=False)
 
         if element is None:
             self.logger.debug("Did not find element.")
-            return input_xml
+            return False
 
         self.logger.debug("Changing content of element %s.", element)
 
-        if random.choice((True, False)) or element.text is None:
-            _contents = list(self.contents)
-            if element.text in _contents:
-                _contents.remove(element.text)
-            element.text = random.choice(_contents)
+        if self.rng.choice((True, False)) or element.text is None:
+            # pick any content but the current one
+            new_text = self._pick_content()
+            while new_text == element.text and 1 < len(self.contents) + len(self.extra_contents):
+                new_text = self._pick_content()
+            element.text = new_text
 
         else:
             element.text = None
+        self._element_index(xml_tree).update(element)
+
+        return True
 
-        return bytearray(self._serialize_xml(xml_tree), encoding="utf-8")
+    def _pick_content(self) -> str:
+        index = self.rng.randrange(len(self.contents) + len(self.extra_contents))
+        if index < len(self.contents):
+            return self.contents[index]
+        return self.extra_contents[index - len(self.contents)]
 
 
 def register() -> None:
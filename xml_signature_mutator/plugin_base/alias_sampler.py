@@ -0,0 +1,61 @@
+import random
+from typing import Any, Iterable, List, Sequence
+
+
+class AliasSampler:
+    """Weighted random choice in O(1) per sample, using Vose's alias method.
+
+    Building the tables takes O(n), so a sampler should be kept as long as the weights do not
+    change. random.choices, in contrast, accumulates all weights on every call. Takes the
+    random number generator to use, so mutators can use it with their own generator, e.g.:
+
+        sampler = AliasSampler(elements, [len(element) + 1 for element in elements])
+        element = sampler.sample(rng)
+    """
+
+    __slots__ = ("items", "_probabilities", "_aliases")
+
+    def __init__(self, items: Sequence[Any], weights: Iterable[float]) -> None:
+        self.items = list(items)
+        weights = list(weights)
+        count = len(self.items)
+        if count == 0 or len(weights) != count:
+            raise ValueError("Need exactly one weight per item and at least one item")
+        total = sum(weights)
+        if total <= 0 or any(weight < 0 for weight in weights):
+            raise ValueError("Weights must not be negative and not all of them can be 0")
+
+        # every column holds an item with probability p and its alias with 1 - p
+        scaled = [weight * count / total for weight in weights]
+        self._probabilities: List[float] = [1.0] * count
+        self._aliases: List[int] = list(range(count))
+
+        small = [column for column, weight in enumerate(scaled) if weight < 1]
+        large = [column for column, weight in enumerate(scaled) if 1 <= weight]
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self._probabilities[less] = scaled[less]
+            self._aliases[less] = more
+            scaled[more] += scaled[less] - 1
+            if scaled[more] < 1:
+                small.append(more)
+            else:
+                large.append(more)
+        # the remaining columns are full, up to rounding errors
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(self, rng: Any = random) -> Any:
+        """Return a random item, chosen with a probability proportional to its weight."""
+        position = rng.random() * len(self.items)
+        column = int(position)
+        # the fractional part decides between the item of the column and its alias
+        if position - column < self._probabilities[column]:
+            return self.items[column]
+        return self.items[self._aliases[column]]
+
+    def sample_k(self, k: int, rng: Any = random) -> List[Any]:
+        """Return k random items, chosen with replacement."""
+        return [self.sample(rng) for _ in range(k)]
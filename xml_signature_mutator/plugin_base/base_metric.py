@@ -27,13 +27,19 @@ class BaseMetric(ABC):
 
         return current_stage_duration
 
-    def _get_measurements(self, data: dict, metric: str):
-        tmp = []
-
+    def _mutator_data(self, data: dict):
+        """Iterate over the data of the mutators the probability distribution is made of.
+        Skips the fallback mutator and entries that are not mutator statistics (e.g., cache
+        counters)."""
         for identifier, metrics in data.items():
-            if identifier == "fallback_mutator":
+            if identifier == "fallback_mutator" or "execs" not in metrics:
                 continue
+            yield identifier, metrics
 
+    def _get_measurements(self, data: dict, metric: str):
+        tmp = []
+
+        for identifier, metrics in self._mutator_data(data):
             value = metrics.get(metric, 0)
 
             tmp.append((identifier, value))
@@ -46,6 +52,10 @@ class BaseMetric(ABC):
 
         res = []
         for key, value in tmp:
+            # all mutators are equally good
+            if max_val == min_val:
+                res.append((key, 1))
+                continue
             val_norm = (value - min_val) / (max_val - min_val)
             if val_norm < 0.1:
                 val_norm = 0.1
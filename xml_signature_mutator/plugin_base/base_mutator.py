@@ -1,10 +1,14 @@
 import logging
 import random
-from abc import ABC, abstractmethod
+from abc import ABC
 from dataclasses import dataclass
-from typing import Any, Tuple
+from typing import Any, Optional, Tuple
 
 from lxml import etree
+from plugin_base import element_index
+from plugin_base.element_index import ElementIndex
+from plugin_base.mutation_result import MutationResult
+from plugin_base.rng import derive_rng
 
 
 @dataclass(kw_only=True)
@@ -12,25 +16,50 @@ class BaseMutator(ABC):
     identifier: str
     logger = logging.getLogger()
     weight: int = 1
+    # Tree-level mutators only change the tree (see mutate_tree). Their result is always
+    # well-formed and they can be stacked. String-level mutators override mutate instead.
+    tree_level = True
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        """Checks the contract abstractmethod cannot express, it depends on tree_level:
+        tree-level mutators implement mutate_tree, string-level mutators implement mutate.
+
+        Raises:
+            TypeError: if the mutator does not implement its method
+        """
+        super().__init_subclass__(**kwargs)
+        if cls.tree_level and not callable(getattr(cls, "mutate_tree", None)):
+            raise TypeError(f"Tree-level mutator {cls.__name__} does not implement mutate_tree")
+        if not cls.tree_level and cls.mutate is BaseMutator.mutate:
+            raise TypeError(f"String-level mutator {cls.__name__} does not implement mutate")
 
     def init(self, seed: bytearray) -> None:
         """Initialized this mutator. Called once per mutation."""
-        random.seed(str(seed))
+        # own generator, independent of the random numbers other plugins draw
+        self.rng = derive_rng(str(seed), self.identifier)
 
     def __post_init__(self) -> None:
+        # replaced in init, only used if the mutator is not initialized
+        self.rng = random.Random()
+
         # configure parser to not strip CDATA or resolve entities.
         parser = etree.XMLParser(strip_cdata=False, resolve_entities=False, remove_comments=False)
         etree.set_default_parser(parser)
 
-    @abstractmethod
     def mutate(
         self,
         input_xml: bytearray,
         xml_tree: etree._Element,
         additional_buffer: bytearray,
         max_size: int,
-    ) -> bytearray:
-        """Applies mutation functions and returns the result."""
+    ) -> MutationResult:
+        """Applies mutation functions and returns the result.
+        Default for tree-level mutators: mutate the tree and serialize it. Tree-level mutators
+        implement mutate_tree(xml_tree) -> bool instead, it mutates the tree in place and
+        returns True, if the tree was changed."""
+        if not self.mutate_tree(xml_tree):
+            return MutationResult(input_xml)
+        return self._tree_result(xml_tree)
 
     def is_subtree_of(self, child: Any, parent: Any) -> bool:
         """_summary_
@@ -42,33 +71,53 @@ class BaseMutator(ABC):
         Returns:
             bool: True, if child is contained in parent. Otherwise, False.
         """
-        if child in parent.iterdescendants():
-            return True
+        # walking up is bounded by the depth of the tree, walking down by its size
+        for ancestor in child.iterancestors():
+            if ancestor == parent:
+                return True
         return False
 
+    def _element_index(self, xml_tree: Any) -> ElementIndex:
+        """Return the element index of the tree. It is built on first use and shared by all
+        mutators working on the same tree."""
+        return element_index.index_of(xml_tree)
+
+    def _tree_result(self, xml_tree: Any) -> MutationResult:
+        """Serialize the mutated tree and keep it, so it does not have to be parsed again."""
+        return MutationResult(bytearray(self._serialize_xml(xml_tree), encoding="utf-8"), xml_tree)
+
     # All code following this comment.
     # Copyright 2021 Jost Rossel
     # Licensed under the Apache License, Version 2.0
 
-    def _pick_element(self, xml_tree: Any, exclude_root_node: bool = False) -> Tuple[int, Any]:
-        """Pick a random element from the current document"""
-        # Get a list of all elements, but nodes like PI and comments
-        elems = list(xml_tree.getroot().iter(tag=etree.Element))
+    def _pick_element(
+        self, xml_tree: Any, exclude_root_node: bool = False, category: Optional[str] = None
+    ) -> Tuple[int, Any]:
+        """Pick a random element from the current document
+
+        Elements are picked from the element index of the tree, see element_index for the
+        available categories. The index is only valid as long as mutators that insert or remove
+        elements update it.
+        """
+        index = self._element_index(xml_tree)
 
         # Is the root node excluded?
-        if exclude_root_node:
-            start = 1
-        else:
-            start = 0
+        if category is None:
+            category = element_index.NON_ROOT if exclude_root_node else element_index.ALL
 
         # Pick a random element
-        try:
-            elem_id = random.randint(start, len(elems) - 1)
-            elem = elems[elem_id]
-            self.logger.debug("Selected random element from file: %s", elem)
-        except ValueError:
-            # Should only occurs if "exclude_root_node = True"
+        elem_id, elem = index.pick_with_position(category, self.rng)
+        if elem is None:
+            # Should only occurs if "exclude_root_node = True" or the category is empty
             return (None, None)
+        if exclude_root_node and elem is index.root:
+            # only possible for categories that contain the root element
+            if index.count(category) < 2:
+                return (None, None)
+            while elem is index.root:
+                elem_id, elem = index.pick_with_position(category, self.rng)
+
+        self.logger.debug("Selected random element from file: %s", elem)
 
         return (elem_id, elem)
 
@@ -0,0 +1,57 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, List
+
+from plugin_base.rng import derive_rng
+
+
+@dataclass
+class BaseScheduler(ABC):
+    """Online alternative to the metrics: chooses the mutators of every mutation and adapts the
+    selection after every execution and every new finding, instead of once per stage.
+
+    The number of executions and findings of each mutator are read from the collected data
+    (execs and new_finds). Additional state of a scheduler is kept in self.stats, which is part
+    of the collected data, so it is checkpointed with it.
+    """
+
+    identifier: str
+
+    def init(self, arms: List[str], data: dict, seed: str = "") -> None:
+        """Called once the mutators are loaded.
+
+        Args:
+            arms (List[str]): identifiers of the mutators to choose from
+            data (dict): the collected data. Contains an entry for every arm.
+            seed (str): the campaign seed, the scheduler derives its generator from it
+        """
+        self.rng = derive_rng(seed, self.identifier)
+        self.arms = list(arms)
+        self.data = data
+        self.stats = data.setdefault("scheduler", {})
+        self.stats.update({"type": type(self).__name__})
+
+    @abstractmethod
+    def probabilities(self) -> Dict[str, float]:
+        """Return the current selection probability of each arm."""
+
+    def choose(self, k: int = 1) -> List[str]:
+        """Choose the arms of the next mutation.
+
+        Args:
+            k (int): number of arms, more than one for stacked mutations
+
+        Returns:
+            List[str]: identifiers of the chosen arms
+        """
+        probabilities = self.probabilities()
+        return self.rng.choices(population=self.arms, weights=probabilities.values(), k=k)
+
+    def record_find(self, arms: List[str]) -> None:
+        """Called after the execution of the last chosen arms led to a new finding."""
+
+    def _pulls(self, arm: str) -> int:
+        return self.data[arm]["execs"]
+
+    def _rewards(self, arm: str) -> int:
+        return self.data[arm]["new_finds"]
@@ -0,0 +1,154 @@
+import random
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from lxml import etree
+
+# Categories elements are sorted into
+ALL = "all"
+NON_ROOT = "non_root"
+HAS_TEXT = "has_text"
+HAS_ATTRIBUTES = "has_attributes"
+
+# Number of trees an index is kept for, see index_of
+_MAX_INDEXED_TREES = 4
+
+
+class _Bucket:
+    """List of elements with O(1) insert, removal and random pick.
+    The position lookup is only built once it is needed for a removal."""
+
+    def __init__(self, elements: List[Any]) -> None:
+        self.elements = elements
+        self._positions: Optional[Dict[Any, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.elements)
+
+    @property
+    def positions(self) -> Dict[Any, int]:
+        if self._positions is None:
+            self._positions = {element: pos for pos, element in enumerate(self.elements)}
+        return self._positions
+
+    def add(self, element: Any) -> None:
+        if element not in self.positions:
+            self.positions[element] = len(self.elements)
+            self.elements.append(element)
+
+    def discard(self, element: Any) -> None:
+        position = self.positions.pop(element, None)
+        if position is None:
+            return
+        # move last element into the gap
+        last = self.elements.pop()
+        if last is not element:
+            self.elements[position] = last
+            self.positions[last] = position
+
+    def pick(self, rng: Any = random) -> Tuple[Optional[int], Optional[Any]]:
+        if not self.elements:
+            return (None, None)
+        position = rng.randrange(len(self.elements))
+        return (position, self.elements[position])
+
+
+def _has_text(element: Any) -> bool:
+    return element.text is not None and len(element.text.strip()) > 0
+
+
+def _has_attributes(element: Any) -> bool:
+    return len(element.attrib) > 0
+
+
+class ElementIndex:
+    """Index of all elements (no comments, PIs, ...) of a tree, sorted into categories.
+
+    The list of all elements is collected once per tree, category lists are collected on their
+    first use. Afterwards, picking an element of any category is O(1). Mutators that insert,
+    remove or change elements have to keep the index up to date with add, remove and update.
+    """
+
+    def __init__(self, xml_tree: Any) -> None:
+        self.root = xml_tree.getroot()
+        self._predicates: Dict[str, Callable[[Any], bool]] = {
+            NON_ROOT: lambda element: element is not self.root,
+            HAS_TEXT: _has_text,
+            HAS_ATTRIBUTES: _has_attributes,
+        }
+        self._buckets: Dict[str, _Bucket] = {ALL: _Bucket(list(self.root.iter(tag=etree.Element)))}
+
+    def __len__(self) -> int:
+        return len(self._buckets[ALL])
+
+    def count(self, category: str = ALL) -> int:
+        return len(self._bucket(category))
+
+    def position(self, element: Any, category: str = ALL) -> Optional[int]:
+        """Position of the element in the category. Positions change when elements are removed."""
+        return self._bucket(category).positions.get(element)
+
+    def pick(self, category: str = ALL, rng: Any = random) -> Optional[Any]:
+        """Pick a random element of the category. Returns None if the category is empty."""
+        return self._bucket(category).pick(rng)[1]
+
+    def pick_with_position(
+        self, category: str = ALL, rng: Any = random
+    ) -> Tuple[Optional[int], Optional[Any]]:
+        """Like pick, but also return the position of the element in the category."""
+        return self._bucket(category).pick(rng)
+
+    def add(self, element: Any) -> None:
+        """Add the element and all of its descendants."""
+        for sub_element in element.iter(tag=etree.Element):
+            self._buckets[ALL].add(sub_element)
+            self.update(sub_element)
+
+    def remove(self, element: Any, with_children: bool = True) -> None:
+        """Remove the element and, if with_children is set, all of its descendants."""
+        elements = element.iter(tag=etree.Element) if with_children else (element,)
+        for sub_element in elements:
+            for bucket in self._buckets.values():
+                bucket.discard(sub_element)
+
+    def update(self, element: Any) -> None:
+        """Sort the element into its categories again, e.g., after its text changed."""
+        for category, bucket in self._buckets.items():
+            if category == ALL:
+                continue
+            if self._predicates[category](element):
+                bucket.add(element)
+            else:
+                bucket.discard(element)
+
+    def _bucket(self, category: str) -> _Bucket:
+        bucket = self._buckets.get(category)
+        if bucket is None:
+            try:
+                predicate = self._predicates[category]
+            except KeyError as exc:
+                raise ValueError(f"Unknown element category {category!r}") from exc
+            bucket = _Bucket(
+                [element for element in self._buckets[ALL].elements if predicate(element)]
+            )
+            self._buckets.update({category: bucket})
+        return bucket
+
+
+_INDEXES: Dict[int, tuple] = {}
+
+
+def index_of(xml_tree: Any) -> ElementIndex:
+    """Return the index of the tree, build it if the tree was not indexed yet.
+
+    Indexes are kept for the last few trees only. The tree is referenced by the cache, so its
+    id cannot be reused by another tree while the index is cached.
+    """
+    cached = _INDEXES.get(id(xml_tree))
+    if cached is not None and cached[0] is xml_tree:
+        return cached[1]
+
+    index = ElementIndex(xml_tree)
+    if _MAX_INDEXED_TREES <= len(_INDEXES):
+        _INDEXES.pop(next(iter(_INDEXES)))
+    _INDEXES[id(xml_tree)] = (xml_tree, index)
+    return index
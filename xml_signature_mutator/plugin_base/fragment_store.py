@@ -0,0 +1,292 @@
+import bisect
+import contextlib
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import tempfile
+from collections.abc import Sequence
+from typing import Any, Dict, List, Optional, Tuple
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"XSMSEED1"
+KEY_SIZE = 32
+SECTION_NAME_SIZE = 16
+# magic, key of the initial inputs, number of sections
+_HEADER = struct.Struct(f"<8s{KEY_SIZE}sI")
+# name, kind, number of entries, offset
+_SECTION = struct.Struct(f"<{SECTION_NAME_SIZE}sIQQ")
+_STRINGS = 0
+_INDICES = 1
+_OFFSET = struct.Struct("<Q")
+_INDEX = struct.Struct("<I")
+_INDEX_SECTIONS = ("roots", "non_root")
+_UNSORTED_SECTIONS = ("fragments", "childless")
+
+# fragments are parsed like the inputs, recover handles entities declared outside the fragment
+_PARSER = etree.XMLParser(
+    strip_cdata=False, resolve_entities=False, remove_comments=False, recover=True
+)
+
+
+def parse_fragment(serialized: str) -> Any:
+    """Return a new element parsed from a serialized fragment."""
+    return etree.fromstring(serialized, _PARSER)
+
+
+def input_key(input_dir: str) -> bytes:
+    """Return a digest of the names and contents of every *.xml file in input_dir."""
+    digest = hashlib.blake2b(digest_size=KEY_SIZE)
+    for file in sorted(pathlib.Path(input_dir).glob("*.xml")):
+        content = file.read_bytes()
+        digest.update(file.name.encode("utf-8"))
+        digest.update(_OFFSET.pack(len(content)))
+        digest.update(content)
+    return digest.digest()
+
+
+class MappedStrings(Sequence):
+    """Read-only list of strings in a memory-mapped store. Entries are decoded when they are
+    accessed, so the pool itself takes no memory of the instance. If the strings are sorted,
+    membership tests are binary searches."""
+
+    def __init__(self, store_map: mmap.mmap, count: int, offset: int, is_sorted: bool) -> None:
+        self._map = store_map
+        self._count = count
+        self._offsets = offset
+        # count + 1 offsets into the blob behind them
+        self._blob = offset + (count + 1) * _OFFSET.size
+        self._sorted = is_sorted
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("string index out of range")
+        start, end = struct.unpack_from("<QQ", self._map, self._offsets + index * _OFFSET.size)
+        return self._map[self._blob + start : self._blob + end].decode("utf-8")
+
+    def __contains__(self, value: Any) -> bool:
+        if not self._sorted:
+            return super().__contains__(value)
+        position = bisect.bisect_left(self, value)
+        return position < self._count and self[position] == value
+
+
+class MappedFragment:
+    """Fragment of the initial inputs in a memory-mapped store, see seed_corpus.Fragment.
+    clone parses the serialized element, so no parsed templates are kept."""
+
+    __slots__ = ("_store", "_index")
+
+    def __init__(self, store: "FragmentStore", index: int) -> None:
+        self._store = store
+        self._index = index
+
+    @property
+    def serialized(self) -> str:
+        return self._store.strings("fragments")[self._index]
+
+    @property
+    def serialized_childless(self) -> str:
+        return self._store.strings("childless")[self._index]
+
+    @property
+    def is_root(self) -> bool:
+        return self._index in self._store.roots
+
+    def clone(self, with_children: bool = True) -> Any:
+        """Return a new element parsed from the fragment."""
+        return parse_fragment(self.serialized if with_children else self.serialized_childless)
+
+
+class MappedFragments(Sequence):
+    """Read-only list of fragments, by their index in the store."""
+
+    def __init__(self, store: "FragmentStore", indices: Optional[Sequence] = None) -> None:
+        self._store = store
+        self._indices = indices
+
+    def __len__(self) -> int:
+        if self._indices is None:
+            return len(self._store.strings("fragments"))
+        return len(self._indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("fragment index out of range")
+        if self._indices is not None:
+            index = self._indices[index]
+        return MappedFragment(self._store, index)
+
+
+class _MappedIndices(Sequence):
+    def __init__(self, store_map: mmap.mmap, count: int, offset: int) -> None:
+        self._map = store_map
+        self._count = count
+        self._offset = offset
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._count))]
+        if not 0 <= index < self._count:
+            raise IndexError("index out of range")
+        return _INDEX.unpack_from(self._map, self._offset + index * _INDEX.size)[0]
+
+
+class FragmentStore:
+    """Pre-serialized fragments and value pools of the initial inputs in a read-only,
+    memory-mapped file, shared by all instances on a machine. The init cache keeps the pools
+    of an instance in the same format, see seed_corpus.load_corpus.
+
+    The first instance builds the file under an exclusive lock of path.lock, the others wait
+    and map it. The file is keyed by a digest of the initial inputs and rebuilt if they
+    change. Every instance only maps the file, so neither memory nor startup time grow with
+    the number of instances.
+
+    Layout: header (magic, key, number of sections), one directory entry per section (name,
+    kind, number of entries, offset), then the sections. A string section holds count + 1
+    offsets followed by the UTF-8 encoded strings, an index section count 32-bit indices.
+
+    Sections:
+        fragments: serialized elements, see seed_corpus.Fragment
+        childless: the same elements without their children
+        roots, non_root: indices of the fragments that are, or are not, root elements
+        attr_keys, attr_values, contents: the sorted value pools
+    """
+
+    def __init__(self, path: pathlib.Path, store_map: mmap.mmap) -> None:
+        self.path = path
+        self._map = store_map
+        self._sections: Dict[str, Tuple[int, int, int]] = {}
+
+        _, _, sections = _HEADER.unpack_from(store_map, 0)
+        for position in range(sections):
+            name, kind, count, offset = _SECTION.unpack_from(
+                store_map, _HEADER.size + position * _SECTION.size
+            )
+            self._sections[name.rstrip(b"\0").decode("ascii")] = (kind, count, offset)
+
+        self._strings = {
+            name: MappedStrings(store_map, count, offset, is_sorted=name not in _UNSORTED_SECTIONS)
+            for name, (kind, count, offset) in self._sections.items()
+            if kind == _STRINGS
+        }
+        indices = {
+            name: _MappedIndices(store_map, count, offset)
+            for name, (kind, count, offset) in self._sections.items()
+            if kind == _INDICES
+        }
+        # there is one root per initial input, few enough to keep them as a set
+        self.roots = frozenset(indices["roots"])
+
+        self.fragments = MappedFragments(self)
+        self.non_root_fragments = MappedFragments(self, indices["non_root"])
+
+    def strings(self, name: str) -> MappedStrings:
+        return self._strings[name]
+
+    @classmethod
+    def open(cls, path: pathlib.Path, input_dir: str, build) -> "FragmentStore":
+        """Map the store at path. Build it first, if it does not exist or belongs to other
+        initial inputs.
+
+        Args:
+            path (pathlib.Path): the store file
+            input_dir (str): directory containing the initial inputs
+            build (Callable[[], Dict[str, list]]): returns the content of every section,
+                called only if the store is (re)built
+
+        Returns:
+            FragmentStore: the mapped store
+        """
+        path = pathlib.Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        key = input_key(input_dir)
+
+        with open(path.with_name(path.name + ".lock"), "a+b") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                store_map = _map_if_current(path, key)
+                if store_map is None:
+                    logger.info("Building fragment store %s.", path)
+                    _write(path, key, build())
+                    store_map = _map_if_current(path, key)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        return cls(path, store_map)
+
+    def close(self) -> None:
+        self._map.close()
+
+
+def _map_if_current(path: pathlib.Path, key: bytes) -> Optional[mmap.mmap]:
+    if not path.exists() or path.stat().st_size < _HEADER.size:
+        return None
+    with open(path, "rb") as file:
+        store_map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, stored_key, _ = _HEADER.unpack_from(store_map, 0)
+    if magic != MAGIC or stored_key != key:
+        store_map.close()
+        return None
+    return store_map
+
+
+def _write(path: pathlib.Path, key: bytes, sections: Dict[str, List]) -> None:
+    directory = []
+    payloads = []
+    offset = _HEADER.size + len(sections) * _SECTION.size
+    for name, entries in sections.items():
+        if name in _INDEX_SECTIONS:
+            kind = _INDICES
+            payload = b"".join(_INDEX.pack(index) for index in entries)
+        else:
+            kind = _STRINGS
+            encoded = [entry.encode("utf-8") for entry in entries]
+            offsets = [0]
+            for entry in encoded:
+                offsets.append(offsets[-1] + len(entry))
+            payload = b"".join(_OFFSET.pack(entry) for entry in offsets) + b"".join(encoded)
+        directory.append(
+            _SECTION.pack(
+                name.encode("ascii").ljust(SECTION_NAME_SIZE, b"\0"), kind, len(entries), offset
+            )
+        )
+        payloads.append(payload)
+        offset += len(payload)
+
+    # written to a temporary file and moved, instances never map a partial store
+    file_descriptor, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".")
+    try:
+        # mkstemp creates the file for the owner only, the store is read by every instance
+        os.fchmod(file_descriptor, 0o644)
+        with os.fdopen(file_descriptor, "wb") as file:
+            file.write(_HEADER.pack(MAGIC, key, len(sections)))
+            file.writelines(directory)
+            file.writelines(payloads)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
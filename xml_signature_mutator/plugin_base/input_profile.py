@@ -0,0 +1,93 @@
+import io
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Tuple
+
+from lxml import etree
+
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+
+# Offsets between two elements, i.e., places where an element can be inserted
+BETWEEN_ELEM_REG = re.compile(r">([^$]){0,2}<")
+# Opening (and self closing) tags
+OPENTAG_REG = re.compile(r"<[^/][\w:.-]*[^>]*>")
+
+
+@dataclass(frozen=True)
+class InputProfile:
+    """Information about a queue entry that is computed once and reused for all fuzz iterations
+    of this entry.
+
+    The offset tables refer to the utf-8 decoded input. They are empty if the input could
+    not be decoded.
+    """
+
+    parsable: bool
+    element_count: int = 0
+    text_element_count: int = 0
+    reference_count: int = 0
+    id_count: int = 0
+    between_elem_offsets: Tuple[int, ...] = ()
+    open_tag_spans: Tuple[Tuple[int, int], ...] = ()
+
+    @property
+    def richness(self) -> int:
+        """Rough measure of how many places the structural mutators can work on."""
+        return (
+            self.element_count
+            + self.text_element_count
+            + 4 * self.reference_count
+            + 2 * self.id_count
+        )
+
+
+def build_profile(buffer: bytes, parse: Optional[Callable[[bytes], Any]] = None) -> InputProfile:
+    """Parse the input once and collect everything the mutators and the energy assignment need.
+
+    Args:
+        buffer (bytes): the queue entry
+        parse (Optional[Callable[[bytes], Any]]): returns the parsed input without modifying
+            it, e.g., TreeCache.peek_tree. Parses with the default parser, if None.
+
+    Returns:
+        InputProfile: the profile of the input
+    """
+    try:
+        input_str = bytes(buffer).decode("utf-8")
+        between_elem_offsets = tuple(m.start() for m in BETWEEN_ELEM_REG.finditer(input_str))
+        open_tag_spans = tuple((m.start(), m.end()) for m in OPENTAG_REG.finditer(input_str))
+    except UnicodeDecodeError:
+        between_elem_offsets = ()
+        open_tag_spans = ()
+
+    try:
+        xml_tree = parse(buffer) if parse is not None else etree.parse(io.BytesIO(buffer))
+    except Exception:
+        return InputProfile(
+            parsable=False,
+            between_elem_offsets=between_elem_offsets,
+            open_tag_spans=open_tag_spans,
+        )
+
+    element_count = 0
+    text_element_count = 0
+    reference_count = 0
+    id_count = 0
+    for element in xml_tree.getroot().iter(tag=etree.Element):
+        element_count += 1
+        if element.text is not None and element.text.strip():
+            text_element_count += 1
+        if element.tag == "{" + DS_NS + "}Reference":
+            reference_count += 1
+        if element.get("ID"):
+            id_count += 1
+
+    return InputProfile(
+        parsable=True,
+        element_count=element_count,
+        text_element_count=text_element_count,
+        reference_count=reference_count,
+        id_count=id_count,
+        between_elem_offsets=between_elem_offsets,
+        open_tag_spans=open_tag_spans,
+    )
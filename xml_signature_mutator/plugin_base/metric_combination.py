@@ -0,0 +1,103 @@
+"""Combination of the scores of several metrics into one probability distribution.
+
+Every metric scores every mutator. The scores are combined per mutator, taking the weights of
+the metrics into account. Metrics with weight 0 are ignored.
+
+Available combinations:
+    weighted_sum: weighted mean of the scores
+    product: weighted geometric mean of the scores, i.e., a mutator has to score well in
+        every metric
+    lexicographic: mutators are ranked by the metric with the highest weight, ties are broken
+        by the metric with the next highest weight, and so on. The score is the normalized rank.
+    pareto: mutators are ranked by their Pareto front (non-dominated sorting). The mutators on
+        the first front get score 1, on the second 1/2, and so on. Weights only select metrics.
+"""
+
+import math
+from typing import Dict, List, Tuple
+
+COMBINATIONS = ("weighted_sum", "product", "lexicographic", "pareto")
+
+
+def combine(
+    evaluations: List[Tuple[Dict[str, float], float]], combination: str
+) -> Dict[str, float]:
+    """Combine the scores of several metrics.
+
+    Args:
+        evaluations (List[Tuple[Dict[str, float], float]]): the scores of every metric by
+            mutator identifier and the weight of the metric
+        combination (str): one of COMBINATIONS
+
+    Returns:
+        Dict[str, float]: combined score by mutator identifier, in the order of the first
+            evaluation
+    """
+    if combination not in COMBINATIONS:
+        raise ValueError(f"Unknown metric combination {combination!r}")
+
+    evaluations = [(scores, weight) for scores, weight in evaluations if weight > 0]
+    if not evaluations:
+        raise ValueError("At least one metric needs a weight greater than 0")
+
+    identifiers = list(evaluations[0][0].keys())
+    if len(evaluations) == 1:
+        return dict(evaluations[0][0])
+
+    if combination == "weighted_sum":
+        total_weight = sum(weight for _, weight in evaluations)
+        return {
+            identifier: sum(scores[identifier] * weight for scores, weight in evaluations)
+            / total_weight
+            for identifier in identifiers
+        }
+
+    if combination == "product":
+        total_weight = sum(weight for _, weight in evaluations)
+        return {
+            identifier: math.prod(scores[identifier] ** weight for scores, weight in evaluations)
+            ** (1 / total_weight)
+            for identifier in identifiers
+        }
+
+    if combination == "lexicographic":
+        # stable sort, metrics with equal weight keep the configured order
+        ordered = sorted(evaluations, key=lambda evaluation: -evaluation[1])
+        keys = {
+            identifier: tuple(scores[identifier] for scores, _ in ordered)
+            for identifier in identifiers
+        }
+        distinct_keys = sorted(set(keys.values()))
+        return {
+            identifier: (distinct_keys.index(keys[identifier]) + 1) / len(distinct_keys)
+            for identifier in identifiers
+        }
+
+    return _pareto_scores(identifiers, [scores for scores, _ in evaluations])
+
+
+def _dominates(first: Tuple[float, ...], second: Tuple[float, ...]) -> bool:
+    return all(a >= b for a, b in zip(first, second)) and first != second
+
+
+def _pareto_scores(identifiers: List[str], evaluations: List[Dict[str, float]]) -> Dict[str, float]:
+    points = {
+        identifier: tuple(scores[identifier] for scores in evaluations)
+        for identifier in identifiers
+    }
+
+    result = {}
+    remaining = list(identifiers)
+    front = 1
+    while remaining:
+        current = [
+            identifier
+            for identifier in remaining
+            if not any(_dominates(points[other], points[identifier]) for other in remaining)
+        ]
+        for identifier in current:
+            result[identifier] = 1 / front
+        remaining = [identifier for identifier in remaining if identifier not in result]
+        front += 1
+
+    return {identifier: result[identifier] for identifier in identifiers}
@@ -0,0 +1,16 @@
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass
+class MutationResult:
+    """Result of a mutate call.
+
+    output: the serialized mutant that is handed to AFL++
+    xml_tree: the mutated tree, if output is an unmodified serialization of it. Mutators that
+        work on the serialized string (e.g., insert CDATA at a random offset) leave it empty,
+        since their output might not be well-formed anymore.
+    """
+
+    output: Optional[bytearray]
+    xml_tree: Optional[Any] = None
@@ -0,0 +1,20 @@
+import hashlib
+import random
+
+
+def derive_rng(seed: str, identifier: str) -> random.Random:
+    """Return the random number generator of a plugin.
+
+    Every plugin draws from its own generator, so its behavior does not depend on how many
+    random numbers other plugins consumed. The generators of all plugins are determined by the
+    campaign seed.
+
+    Args:
+        seed (str): the campaign seed
+        identifier (str): identifies the plugin, e.g., the identifier of a mutator
+
+    Returns:
+        random.Random: a generator seeded from the campaign seed and the identifier
+    """
+    digest = hashlib.blake2b(f"{seed}\0{identifier}".encode("utf-8"), digest_size=16).digest()
+    return random.Random(int.from_bytes(digest, "big"))
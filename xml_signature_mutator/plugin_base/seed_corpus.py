@@ -0,0 +1,227 @@
+import copy
+import io
+import logging
+import os
+import pathlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from lxml import etree
+from lxml.etree import XMLSyntaxError
+from plugin_base.fragment_store import FragmentStore, parse_fragment
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Fragment:
+    """An element of an initial input, prepared for insertion into other documents.
+
+    The templates are standalone copies of the element, with and without its children. They
+    must not be modified; use clone to get an element that can be inserted somewhere.
+    """
+
+    serialized: str
+    serialized_childless: str
+    template: Any
+    template_childless: Any
+    is_root: bool = False
+
+    def clone(self, with_children: bool = True) -> Any:
+        """Return a private copy of the element. Only copies this fragment."""
+        return copy.deepcopy(self.template if with_children else self.template_childless)
+
+    @classmethod
+    def from_serialized(
+        cls, serialized: str, serialized_childless: str, is_root: bool = False
+    ) -> "Fragment":
+        return cls(
+            serialized=serialized,
+            serialized_childless=serialized_childless,
+            template=parse_fragment(serialized),
+            template_childless=parse_fragment(serialized_childless),
+            is_root=is_root,
+        )
+
+    @classmethod
+    def from_element(cls, element: Any, is_root: bool = False) -> "Fragment":
+        template = copy.deepcopy(element)
+        template.tail = None
+
+        template_childless = copy.deepcopy(template)
+        for child in list(template_childless):
+            template_childless.remove(child)
+
+        return cls(
+            serialized=_serialize(template),
+            serialized_childless=_serialize(template_childless),
+            template=template,
+            template_childless=template_childless,
+            is_root=is_root,
+        )
+
+
+def _serialize(element: Any) -> str:
+    return etree.tostring(element, with_tail=False, xml_declaration=False, encoding="unicode")
+
+
+@dataclass(frozen=True)
+class SeedCorpus:
+    """Pools extracted from the initial inputs. Loaded once and shared by all mutators.
+
+    All pools are sequences with O(1) random picks, tuples or the read-only views of a
+    FragmentStore. The value pools are sorted, so they do not depend on hash seeds. The trees
+    must not be modified and are only kept without a store. Mutators that insert elements from
+    the initial inputs use the fragment pools: fragments contains every element (including
+    the root elements), non_root_fragments every element but the root elements.
+    """
+
+    trees: Tuple[Any, ...] = ()
+    fragments: Sequence[Fragment] = ()
+    non_root_fragments: Sequence[Fragment] = ()
+    attr_keys: Sequence[str] = ()
+    attr_values: Sequence[str] = ()
+    contents: Sequence[str] = ()
+
+
+_CORPUS: Optional[SeedCorpus] = None
+
+
+def load_corpus(
+    input_dir: Optional[str], store_path: Optional[str] = None, cache_path: Optional[str] = None
+) -> SeedCorpus:
+    """Parse every *.xml file in input_dir once and extract the pools.
+
+    If store_path is given, the pools are kept in a FragmentStore at store_path, shared by all
+    instances on the machine. Only the first instance parses the initial inputs, the fragments
+    are parsed again on every clone.
+
+    Otherwise, if cache_path is given, the pools are cached in a FragmentStore at cache_path,
+    so restarts do not parse the initial inputs. The pools are copied into memory and the
+    templates of the fragments are parsed once, clones are copies like without a cache. The
+    first start builds its templates from the cache as well, restarts get the same fragments.
+
+    Args:
+        input_dir (Optional[str]): directory containing the initial inputs
+        store_path (Optional[str]): path of the shared store
+        cache_path (Optional[str]): path of the store of the init cache
+
+    Returns:
+        SeedCorpus: the loaded corpus. It is also returned by get_corpus from now on.
+    """
+    global _CORPUS
+
+    if input_dir and store_path:
+        store = FragmentStore.open(
+            pathlib.Path(store_path), input_dir, lambda: _store_sections(_extract(input_dir))
+        )
+        _CORPUS = SeedCorpus(
+            fragments=store.fragments,
+            non_root_fragments=store.non_root_fragments,
+            attr_keys=store.strings("attr_keys"),
+            attr_values=store.strings("attr_values"),
+            contents=store.strings("contents"),
+        )
+        logger.info("Mapped %d fragments from %s.", len(store.fragments), store.path)
+        return _CORPUS
+
+    if input_dir and cache_path:
+        store = FragmentStore.open(
+            pathlib.Path(cache_path), input_dir, lambda: _store_sections(_extract(input_dir))
+        )
+        try:
+            _CORPUS = _from_store(store)
+        finally:
+            store.close()
+        logger.info("Loaded %d fragments from %s.", len(_CORPUS.fragments), store.path)
+        return _CORPUS
+
+    corpus = _extract(input_dir)
+    _CORPUS = corpus
+    logger.info(
+        "Loaded %d initial inputs with %d fragments.", len(corpus.trees), len(corpus.fragments)
+    )
+
+    return _CORPUS
+
+
+def _extract(input_dir: Optional[str]) -> SeedCorpus:
+    trees = []
+    fragments = []
+    attr_keys = set()
+    attr_values = set()
+    contents = set()
+
+    if input_dir:
+        for file in sorted(pathlib.Path(input_dir).glob("*.xml")):
+            logger.debug('Loading initial input "%s".', file.name)
+            try:
+                xml_tree = etree.parse(io.BytesIO(file.read_bytes()))
+            except XMLSyntaxError as exp:
+                logger.info(
+                    "During init, could not get elements from input %s due to parser exception: %s.",
+                    file,
+                    exp,
+                )
+                continue
+
+            trees.append(xml_tree)
+            root = xml_tree.getroot()
+            for element in root.iter(tag=etree.Element):
+                fragments.append(Fragment.from_element(element, is_root=element is root))
+            for element in xml_tree.getroot().iterdescendants():
+                for key, value in element.attrib.items():
+                    attr_keys.add(key)
+                    attr_values.add(value)
+                if element.text:
+                    contents.add(element.text.strip())
+    else:
+        logger.warning("No input directory given. Mutators that use initial inputs will fail.")
+
+    return SeedCorpus(
+        trees=tuple(trees),
+        fragments=tuple(fragments),
+        non_root_fragments=tuple(fragment for fragment in fragments if not fragment.is_root),
+        attr_keys=tuple(sorted(attr_keys)),
+        attr_values=tuple(sorted(attr_values)),
+        contents=tuple(sorted(contents)),
+    )
+
+
+def _store_sections(corpus: SeedCorpus) -> Dict[str, List]:
+    """Return the sections of a FragmentStore for the corpus."""
+    return {
+        "fragments": [fragment.serialized for fragment in corpus.fragments],
+        "childless": [fragment.serialized_childless for fragment in corpus.fragments],
+        "roots": [index for index, fragment in enumerate(corpus.fragments) if fragment.is_root],
+        "non_root": [
+            index for index, fragment in enumerate(corpus.fragments) if not fragment.is_root
+        ],
+        "attr_keys": list(corpus.attr_keys),
+        "attr_values": list(corpus.attr_values),
+        "contents": list(corpus.contents),
+    }
+
+
+def _from_store(store: FragmentStore) -> SeedCorpus:
+    """Return an in-memory corpus with the content of the store."""
+    fragments = tuple(
+        Fragment.from_serialized(serialized, serialized_childless, is_root=index in store.roots)
+        for index, (serialized, serialized_childless) in enumerate(
+            zip(store.strings("fragments"), store.strings("childless"))
+        )
+    )
+    return SeedCorpus(
+        fragments=fragments,
+        non_root_fragments=tuple(fragment for fragment in fragments if not fragment.is_root),
+        attr_keys=tuple(store.strings("attr_keys")),
+        attr_values=tuple(store.strings("attr_values")),
+        contents=tuple(store.strings("contents")),
+    )
+
+
+def get_corpus() -> SeedCorpus:
+    """Return the loaded corpus. Loads it from INPUT_DIR, if that did not happen yet."""
+    if _CORPUS is None:
+        return load_corpus(os.getenv("INPUT_DIR"))
+    return _CORPUS
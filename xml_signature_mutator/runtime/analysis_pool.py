@@ -0,0 +1,160 @@
+import concurrent.futures
+import io
+import logging
+import multiprocessing
+import queue
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Iterator, Optional, Tuple
+
+from lxml import etree
+from validation.validity_oracle import ValidityOracle
+
+# validator of a worker process, created by its initializer
+_ORACLE: Optional[ValidityOracle] = None
+
+
+def _init_worker(oracle_cfg: dict) -> None:
+    global _ORACLE
+    # same parser configuration as the fuzzer process
+    etree.set_default_parser(
+        etree.XMLParser(strip_cdata=False, resolve_entities=False, remove_comments=False)
+    )
+    _ORACLE = ValidityOracle(**oracle_cfg)
+    # the workers only validate, inherited from the fuzzer process if it compiled it already
+    _ORACLE.compile_schema()
+
+
+def _analyze(
+    mutated_input: bytes, mutator_ids: Tuple[str, ...]
+) -> Tuple[Tuple[str, ...], bool, bool]:
+    """Check a mutant in a worker process.
+
+    Returns:
+        Tuple[Tuple[str, ...], bool, bool]: the mutator ids, whether the mutant is well-formed
+            and whether it is valid SAML
+    """
+    try:
+        xml_tree = etree.parse(io.BytesIO(mutated_input))
+    except Exception:
+        return mutator_ids, False, False
+
+    try:
+        return mutator_ids, True, _ORACLE.is_valid(xml_tree.getroot())
+    except Exception:
+        return mutator_ids, True, False
+
+
+@dataclass
+class AnalysisPool:
+    """Checks mutants for well-formedness and SAML validity in a pool of worker processes.
+
+    Validation with lxml/xmlsec holds the GIL most of the time, so processes are used instead
+    of threads. At most max_pending mutants are in flight. If the workers fall behind, further
+    mutants are dropped instead of blocking the fuzzer. Dropped mutants are not counted as
+    validated, so the scaled validity rates stay unbiased.
+
+    Results are collected with results(), in the fuzzer process, so the statistics are only
+    ever modified by one thread.
+
+    The workers are forked when the pool is created (in load_plugins), before the checkpointer
+    starts its thread: a child forked while another thread holds a lock (e.g., of logging) can
+    deadlock. If a worker dies (e.g., killed for its memory), the pool is broken. Its mutants
+    are counted as failed and the pool disables itself, the fuzzer validates in-process then.
+
+    enabled: if False, no workers are started
+    workers: number of worker processes
+    max_pending: maximal number of mutants that are submitted but not collected yet
+    start_method: multiprocessing start method. fork works when embedded in AFL++, where
+        sys.executable is not a Python interpreter.
+    oracle_cfg: arguments of the ValidityOracle of the workers
+    stats: dict the counters are written to (e.g., DATA["analysis_pool"])
+    """
+
+    enabled: bool = False
+    workers: int = 2
+    max_pending: int = 256
+    start_method: str = "fork"
+    oracle_cfg: dict = field(default_factory=dict)
+    stats: dict = field(default_factory=dict)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        if self.workers < 1:
+            raise ValueError("workers must be at least 1")
+        if self.max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+
+        self._executor: Optional[concurrent.futures.ProcessPoolExecutor] = None
+        self._done: "queue.SimpleQueue[concurrent.futures.Future]" = queue.SimpleQueue()
+        self._pending = 0
+        for counter in ("submitted", "dropped", "completed", "failed"):
+            self.stats.setdefault(counter, 0)
+
+        if self.enabled:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+                initializer=_init_worker,
+                initargs=(self.oracle_cfg,),
+            )
+            # with fork, the first task starts all workers
+            self._executor.submit(int).result()
+
+    def submit(self, mutated_input: bytes, mutator_ids) -> bool:
+        """Queue a mutant for analysis.
+
+        Returns:
+            bool: True, if the mutant was queued. False, if it was dropped.
+        """
+        if self._executor is None or self.max_pending <= self._pending:
+            self.stats["dropped"] += 1
+            return False
+
+        try:
+            future = self._executor.submit(_analyze, bytes(mutated_input), tuple(mutator_ids))
+        except (BrokenProcessPool, RuntimeError) as exp:
+            self.stats["failed"] += 1
+            self._disable(exp)
+            return False
+        # runs in a thread of the executor, only hand the future over
+        future.add_done_callback(self._done.put)
+        self._pending += 1
+        self.stats["submitted"] += 1
+        return True
+
+    def results(self) -> Iterator[Tuple[Tuple[str, ...], bool, bool]]:
+        """Yield the results of all finished analyses. Never blocks."""
+        while True:
+            try:
+                future = self._done.get_nowait()
+            except queue.Empty:
+                return
+
+            self._pending -= 1
+            try:
+                result = future.result()
+            except Exception as exp:
+                self.stats["failed"] += 1
+                if isinstance(exp, BrokenProcessPool):
+                    self._disable(exp)
+                else:
+                    self.logger.warning("Analysis of a mutant failed. %s.", exp)
+                continue
+
+            self.stats["completed"] += 1
+            yield result
+
+    def _disable(self, exp: Exception) -> None:
+        if self._executor is None:
+            return
+        self.logger.error("Analysis pool is broken, validating in-process from now on. %s.", exp)
+        self.enabled = False
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def close(self) -> None:
+        """Wait for the submitted analyses and stop the workers."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
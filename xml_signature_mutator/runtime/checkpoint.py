@@ -0,0 +1,157 @@
+import logging
+import os
+import pathlib
+import pickle
+import re
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+CHECKPOINT_REG = re.compile(r"^checkpoint-(\d{8})\.(full|delta)$")
+
+
+@dataclass
+class Checkpointer:
+    """Writes checkpoints in a background thread and loads the latest one.
+
+    A checkpoint is a dict of named sections, each of them is pickled separately. Every
+    full_every-th checkpoint is full, the others are deltas that only contain the sections that
+    changed since the previous checkpoint. Files are written to a temporary file and renamed,
+    so a crash never leaves a partially written checkpoint behind. Once a full checkpoint is
+    written, all older checkpoints are removed.
+
+    directory: where the checkpoints are stored
+    full_every: every full_every-th checkpoint is full
+    """
+
+    directory: pathlib.Path
+    full_every: int = 6
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        if self.full_every < 1:
+            raise ValueError("full_every must be at least 1")
+        self.directory = pathlib.Path(self.directory)
+        self.directory.mkdir(exist_ok=True, parents=True)
+
+        self._condition = threading.Condition()
+        self._pending: Optional[Dict[str, bytes]] = None
+        self._busy = False
+        self._thread: Optional[threading.Thread] = None
+
+        # sections of the last written checkpoint, deltas are relative to them
+        self._written: Dict[str, bytes] = {}
+        checkpoints = self._checkpoints()
+        self._sequence = checkpoints[-1][0] if checkpoints else 0
+        # the first checkpoint of a campaign is always full
+        self._since_full = 0
+
+    def _checkpoints(self) -> List[Tuple[int, str, pathlib.Path]]:
+        """Return (sequence, kind, path) of all checkpoints, oldest first."""
+        checkpoints = []
+        for path in self.directory.iterdir():
+            match = CHECKPOINT_REG.match(path.name)
+            if match:
+                checkpoints.append((int(match.group(1)), match.group(2), path))
+        return sorted(checkpoints)
+
+    def submit(self, sections: Dict[str, Any]) -> None:
+        """Take a snapshot of the sections and write it in the background. Returns immediately.
+
+        The sections are pickled right away, so they can be modified afterwards. If the previous
+        checkpoint is still being written, only the latest snapshot is kept.
+        """
+        snapshot = {
+            name: pickle.dumps(value, pickle.HIGHEST_PROTOCOL) for name, value in sections.items()
+        }
+        with self._condition:
+            self._pending = snapshot
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="checkpointer", daemon=True)
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self) -> None:
+        """Block until all submitted checkpoints are written."""
+        with self._condition:
+            while self._pending is not None or self._busy:
+                self._condition.wait()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                while self._pending is None:
+                    self._condition.wait()
+                snapshot, self._pending = self._pending, None
+                self._busy = True
+
+            try:
+                self._write(snapshot)
+            except Exception as exp:
+                self.logger.critical(
+                    "Error while writing checkpoint: %s. Recover after crash likely not possible.",
+                    exp,
+                )
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _write(self, snapshot: Dict[str, bytes]) -> None:
+        full = self._since_full % self.full_every == 0
+        if full:
+            sections = snapshot
+        else:
+            sections = {
+                name: value for name, value in snapshot.items() if self._written.get(name) != value
+            }
+
+        sequence = self._sequence + 1
+        path = self.directory.joinpath(f"checkpoint-{sequence:08d}.{'full' if full else 'delta'}")
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".checkpoint-")
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                pickle.dump(sections, file, pickle.HIGHEST_PROTOCOL)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+        self._sequence = sequence
+        self._since_full = 1 if full else self._since_full + 1
+        self._written = snapshot
+        self.logger.debug("Wrote checkpoint %s with %d sections.", path.name, len(sections))
+
+        if full:
+            for old_sequence, _, old_path in self._checkpoints():
+                if old_sequence < sequence:
+                    old_path.unlink(missing_ok=True)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the sections of the latest checkpoint, None if there is none.
+
+        The latest full checkpoint is combined with all deltas written after it. Further
+        checkpoints are deltas relative to the loaded one.
+        """
+        checkpoints = self._checkpoints()
+        full_positions = [
+            position for position, (_, kind, _) in enumerate(checkpoints) if kind == "full"
+        ]
+        if not full_positions:
+            return None
+
+        sections: Dict[str, bytes] = {}
+        for _, _, path in checkpoints[full_positions[-1] :]:
+            with open(path, "rb") as file:
+                sections.update(pickle.load(file))
+
+        self._written = sections
+        self._sequence = checkpoints[-1][0]
+        self._since_full = len(checkpoints) - full_positions[-1]
+        return {name: pickle.loads(value) for name, value in sections.items()}
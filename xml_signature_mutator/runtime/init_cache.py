@@ -0,0 +1,90 @@
+import contextlib
+import hashlib
+import logging
+import os
+import pathlib
+import pickle
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict
+
+import yaml
+
+# the C implementation of libyaml, if PyYAML was built with it
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@dataclass
+class InitCache:
+    """On-disk cache of the work init does before fuzzing, kept across restarts.
+
+    Holds the parsed configuration files, keyed by the hash of their content, and the pools
+    of the initial inputs in a FragmentStore, keyed by the hash of the input directory (see
+    plugin_base.seed_corpus.load_corpus). A warm start parses neither YAML nor the initial
+    inputs, but it still rebuilds the fragment templates by parsing every cached fragment
+    (with and without its children). Changed files are simply cache misses, entries that were
+    not used by the last start are dropped when the cache is saved.
+
+    directory: directory of the cache files, e.g., in the backup directory
+    """
+
+    directory: pathlib.Path
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self.directory = pathlib.Path(self.directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._configs_path = self.directory.joinpath("configs.pickle")
+        self._configs: Dict[str, bytes] = {}
+        self._used: Dict[str, bytes] = {}
+        self.hits = 0
+        self.misses = 0
+
+        try:
+            with open(self._configs_path, "rb") as file:
+                self._configs = pickle.load(file)
+        except FileNotFoundError:
+            pass
+        except (OSError, pickle.UnpicklingError, EOFError) as exp:
+            self.logger.warning("Ignoring unreadable init cache %s. %s.", self._configs_path, exp)
+
+    @property
+    def corpus_path(self) -> pathlib.Path:
+        """Path of the FragmentStore that caches the pools of the initial inputs."""
+        return self.directory.joinpath("corpus.store")
+
+    def load_yaml(self, text: str) -> Any:
+        """Return the parsed YAML document. Every call returns a new object, callers may
+        modify it.
+
+        Raises:
+            yaml.YAMLError: if the document is not cached and cannot be parsed
+        """
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        parsed = self._configs.get(digest)
+        if parsed is None:
+            self.misses += 1
+            parsed = pickle.dumps(yaml.load(text, Loader=SafeLoader))
+        else:
+            self.hits += 1
+        self._used[digest] = parsed
+        return pickle.loads(parsed)
+
+    def save(self) -> None:
+        """Write the parsed configurations of this start, if any of them was a miss."""
+        if not self.misses and len(self._used) == len(self._configs):
+            return
+
+        file_descriptor, tmp_path = tempfile.mkstemp(
+            dir=self.directory, prefix=self._configs_path.name + "."
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as file:
+                pickle.dump(self._used, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._configs_path)
+        except BaseException:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(tmp_path)
+            raise
+        self._configs = dict(self._used)
+        self.misses = 0
@@ -0,0 +1,363 @@
+"""Long-lived local daemon that runs the mutators for several AFL++ instances.
+
+The AFL++ instances load mutation_client as their custom mutator. It forwards the calls over a
+Unix domain socket to this daemon, so plugin loading, the imports of the validation and the
+parsing of the initial inputs are paid once per worker instead of once per AFL++ instance.
+
+Usage:
+    python -m runtime.mutation_daemon --socket /tmp/xml_signature_mutator.sock --workers 4
+
+Every worker is a process that runs afl_interface and serves any number of connections. The
+workers share the listening socket, the kernel distributes the connections. With more than one
+worker, the workers pool their statistics through runtime.shared_stats, SHARED_STATS_DIR
+defaults to the directory of the socket. Every worker logs and checkpoints to its own
+subdirectory (worker-<index>) of LOG_DIR and BACKUP_DIR.
+
+The socket is only accessible by the user of the daemon (mode 0600), and the daemon only serves
+peers of the same user or root (SO_PEERCRED).
+
+Protocol: every message is a 32-bit length followed by a JSON object. Buffers are not sent over
+the socket. Every client creates a file in SHM_DIR (the shared buffer) and announces it with
+"hello". The daemon only maps regular files directly in SHM_DIR, named like the files of the
+client and owned by the user of the peer. Inputs are written to the start of the shared buffer,
+the daemon writes mutants behind them. Requests:
+    hello: {"shm": path, "size": bytes} maps the shared buffer, sent again when it grows
+    fuzz: {"length", "max_size", "batch"} returns up to batch mutants of the input as
+        {"mutants": [[offset, length, mutation], ...]}. mutation describes the mutators that
+        produced the mutant and is sent back with introspection. With SIGNATURE_REPAIR_KEY,
+        the mutants are already post-processed, the client has no post_process hook.
+    introspection: {"mutation"} attributes a finding to the mutators of the mutation
+    fuzz_count: {"length"}, queue_new_entry: {"new", "orig"}, queue_get: {"filename"}
+    init_trim: {"length"}, trim: {} returns the length of the trimmed entry, written to the
+        start of the shared buffer, post_trim: {"success"}. Every client has its own trimmer.
+Every reply has "result" or "error".
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import os
+import pathlib
+import selectors
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "xml_signature_mutator.sock")
+# directory and name prefix of the shared buffers of the clients
+SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+SHM_PREFIX = "xml_signature_mutator-"
+# STATE entries of afl_interface that describe the last mutation
+MUTATION_STATE = ("last_mutation", "last_chain", "last_stack_length")
+
+_LENGTH = struct.Struct("<I")
+# struct ucred: pid, uid, gid
+_PEER_CREDENTIALS = struct.Struct("3i")
+
+
+def send_message(connection: socket.socket, message: dict) -> None:
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    connection.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def receive_message(connection: socket.socket) -> Optional[dict]:
+    """Return the next message, or None if the connection was closed."""
+    header = _receive_exactly(connection, _LENGTH.size)
+    if header is None:
+        return None
+    payload = _receive_exactly(connection, _LENGTH.unpack(header)[0])
+    if payload is None:
+        return None
+    return json.loads(payload)
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+    chunks = []
+    while size:
+        chunk = connection.recv(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def peer_uid(connection: socket.socket) -> int:
+    """Return the user id of the process at the other end of a Unix domain socket."""
+    if not hasattr(socket, "SO_PEERCRED"):
+        # not Linux, the mode of the socket still restricts the peers to the user
+        return os.getuid()
+    credentials = connection.getsockopt(
+        socket.SOL_SOCKET, socket.SO_PEERCRED, _PEER_CREDENTIALS.size
+    )
+    _, uid, _ = _PEER_CREDENTIALS.unpack(credentials)
+    return uid
+
+
+@dataclass
+class Session:
+    """A connected client and its shared buffer."""
+
+    connection: socket.socket
+    uid: int
+    shared_buffer: Optional[mmap.mmap] = None
+    trimmer: Any = None
+    logger = logging.getLogger(__name__)
+
+    def map(self, path: str, size: int) -> None:
+        """Map the shared buffer of the client. Only regular files of the client in SHM_DIR."""
+        directory, name = os.path.split(path)
+        if os.path.realpath(directory) != os.path.realpath(SHM_DIR) or not name.startswith(
+            SHM_PREFIX
+        ):
+            raise PermissionError(f"Shared buffer {path!r} is not a file in {SHM_DIR}")
+
+        # O_NOFOLLOW: the name must not be a symbolic link to another file
+        file_descriptor = os.open(path, os.O_RDWR | os.O_NOFOLLOW)
+        try:
+            status = os.fstat(file_descriptor)
+            if not stat.S_ISREG(status.st_mode) or status.st_uid != self.uid:
+                raise PermissionError(f"Shared buffer {path!r} is not a file of the client")
+            # accessing a mapping behind the end of the file kills the worker with SIGBUS
+            if status.st_size < size:
+                raise ValueError(f"Shared buffer {path!r} is smaller than {size} bytes")
+            self.close_buffer()
+            self.shared_buffer = mmap.mmap(file_descriptor, size)
+        finally:
+            os.close(file_descriptor)
+
+    def close_buffer(self) -> None:
+        if self.shared_buffer is not None:
+            self.shared_buffer.close()
+            self.shared_buffer = None
+
+
+@dataclass
+class Worker:
+    """Serves the connections of one process with afl_interface.
+
+    Requests are handled one at a time, afl_interface is not thread-safe. The description of
+    the last mutation is global in afl_interface. It is returned with every mutant and set
+    again for introspection, so the findings of every client are attributed to its mutators.
+    """
+
+    listener: socket.socket
+    interface: Any
+    sessions: Dict[int, Session] = field(default_factory=dict)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self._running = True
+        self._selector = selectors.DefaultSelector()
+        self.listener.setblocking(False)
+        self._selector.register(self.listener, selectors.EVENT_READ)
+
+    def stop(self, *_) -> None:
+        self._running = False
+
+    def serve(self) -> None:
+        while self._running:
+            for key, _ in self._selector.select(timeout=1.0):
+                if key.fileobj is self.listener:
+                    self._accept()
+                else:
+                    self._handle(self.sessions[key.fileobj.fileno()])
+
+        for session in list(self.sessions.values()):
+            self._close(session)
+        self._selector.close()
+
+    def _accept(self) -> None:
+        try:
+            connection, _ = self.listener.accept()
+        except BlockingIOError:
+            # another worker accepted the connection
+            return
+        uid = peer_uid(connection)
+        if uid not in (os.getuid(), 0):
+            self.logger.warning("Refusing connection of user %d.", uid)
+            connection.close()
+            return
+        connection.setblocking(True)
+        self.sessions[connection.fileno()] = Session(connection, uid)
+        self._selector.register(connection, selectors.EVENT_READ)
+
+    def _close(self, session: Session) -> None:
+        self._selector.unregister(session.connection)
+        del self.sessions[session.connection.fileno()]
+        session.close_buffer()
+        session.connection.close()
+
+    def _handle(self, session: Session) -> None:
+        try:
+            request = receive_message(session.connection)
+        except (OSError, ValueError) as exp:
+            self.logger.warning("Dropping client after invalid request. %s.", exp)
+            request = None
+        if request is None:
+            self._close(session)
+            return
+
+        try:
+            reply = {"result": self._dispatch(session, request)}
+        except Exception as exp:  # reported to the client, the worker keeps serving
+            self.logger.error("Request %s failed. %s", request.get("op"), exp)
+            reply = {"error": f"{type(exp).__name__}: {exp}"}
+
+        try:
+            send_message(session.connection, reply)
+        except OSError:
+            self._close(session)
+
+    def _dispatch(self, session: Session, request: dict) -> Any:
+        operation = request.get("op")
+        if operation == "hello":
+            session.map(request["shm"], request["size"])
+            return True
+        if operation == "fuzz":
+            return self._fuzz(session, request["length"], request["max_size"], request["batch"])
+        if operation == "introspection":
+            self.interface.STATE.update(request["mutation"])
+            return self.interface.introspection().decode("utf-8")
+        if operation == "fuzz_count":
+            return self.interface.fuzz_count(session.shared_buffer[: request["length"]])
+        if operation in ("init_trim", "trim", "post_trim"):
+            return self._trim(session, operation, request)
+        if operation == "queue_new_entry":
+            return self.interface.queue_new_entry(request["new"], request["orig"])
+        if operation == "queue_get":
+            return self.interface.queue_get(request["filename"])
+        raise ValueError(f"Unknown operation {operation!r}")
+
+    def _trim(self, session: Session, operation: str, request: dict) -> int:
+        # trimming takes several requests, the trimmer of afl_interface is shared by all clients
+        if session.trimmer is None:
+            # imported here, the client imports this module and does not need lxml
+            from runtime.xml_trimmer import XmlTrimmer
+
+            session.trimmer = XmlTrimmer(
+                parser=self.interface.PLUGIN_STATE.get("parser"),
+                stats=self.interface.PLUGIN_STATE.get("trimmer").stats,
+                max_steps=self.interface.PLUGIN_STATE.get("trimmer").max_steps,
+            )
+        if operation == "init_trim":
+            return session.trimmer.init(session.shared_buffer[: request["length"]])
+        if operation == "post_trim":
+            return session.trimmer.post_trim(request["success"])
+
+        trimmed = session.trimmer.trim()
+        session.shared_buffer[: len(trimmed)] = trimmed
+        return len(trimmed)
+
+    def _fuzz(self, session: Session, length: int, max_size: int, batch: int) -> List[list]:
+        shared_buffer = session.shared_buffer
+        buffer = bytearray(shared_buffer[:length])
+
+        mutants = []
+        offset = length
+        for _ in range(max(1, batch)):
+            # only mutate, if the mutant is certain to fit. The first one is truncated instead.
+            if mutants and len(shared_buffer) < offset + max_size:
+                break
+            # the mutators may modify the buffer
+            mutated = self.interface.fuzz(bytearray(buffer), b"", max_size)
+            # saves a request per execution, post_process is deterministic
+            mutated = self.interface.post_process(mutated)
+            mutated = mutated[: min(max_size, len(shared_buffer) - offset)]
+            shared_buffer[offset : offset + len(mutated)] = mutated
+            mutation = {key: self.interface.STATE.get(key) for key in MUTATION_STATE}
+            mutants.append([offset, len(mutated), mutation])
+            offset += len(mutated)
+
+        return mutants
+
+
+def run_worker(index: int, listener: socket.socket, seed: str, shared: bool) -> None:
+    """Initialize afl_interface in this process and serve until SIGTERM or SIGINT."""
+    for variable, default in (
+        ("LOG_DIR", ".log/"),
+        ("BACKUP_DIR", ".backup/"),
+    ):
+        base = os.getenv(variable, str(pathlib.Path(__file__).parent.parent.joinpath(default)))
+        os.environ[variable] = str(pathlib.Path(base).joinpath(f"worker-{index}"))
+    if shared:
+        os.environ["SHARED_STATS_INSTANCE"] = f"daemon-worker-{index}"
+
+    import afl_interface
+
+    afl_interface.init(f"{seed}/{index}")
+    worker = Worker(listener=listener, interface=afl_interface)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    try:
+        worker.serve()
+    finally:
+        afl_interface.deinit()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n", 1)[0])
+    parser.add_argument("--socket", default=os.getenv("MUTATION_DAEMON_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", default=str(time.time()))
+    args = parser.parse_args(argv)
+
+    socket_path = pathlib.Path(args.socket)
+    socket_path.unlink(missing_ok=True)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    # only the user of the daemon may connect, also while the socket is created
+    umask = os.umask(0o177)
+    try:
+        listener.bind(str(socket_path))
+    finally:
+        os.umask(umask)
+    os.chmod(socket_path, 0o600)
+    listener.listen(128)
+
+    shared = 1 < args.workers
+    if shared:
+        os.environ.setdefault("SHARED_STATS_DIR", str(socket_path.parent))
+
+    children = []
+    for index in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(index, listener, args.seed, shared)
+            except BaseException:
+                logging.getLogger(__name__).exception("Worker %d failed.", index)
+                code = 1
+            finally:
+                os._exit(code)
+        children.append(pid)
+
+    def forward(signum, _):
+        for child in children:
+            try:
+                os.kill(child, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    code = 0
+    for child in children:
+        _, status = os.waitpid(child, 0)
+        code = code or os.waitstatus_to_exitcode(status)
+    listener.close()
+    socket_path.unlink(missing_ok=True)
+    return code
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+    sys.exit(main())
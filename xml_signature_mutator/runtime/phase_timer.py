@@ -0,0 +1,72 @@
+import bisect
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+PHASES = ("parse", "selection", "mutate", "serialize", "well_formed", "schema", "fallback")
+
+# inclusive upper bounds of the histogram buckets in microseconds, the last bucket is open
+BUCKET_BOUNDS_US = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+
+def new_histogram() -> dict:
+    """Return an empty histogram with one bucket per bound and one overflow bucket."""
+    return {"count": 0, "total_ns": 0, "buckets": [0] * (len(BUCKET_BOUNDS_US) + 1)}
+
+
+@dataclass
+class PhaseTimer:
+    """Measures the phases of a fuzz call and aggregates them per mutator.
+
+    A call is started with begin(). Phases are measured with start() and stop() and may occur
+    more than once per call, their durations add up. flush() adds the durations of the call to
+    fixed-bucket histograms in the data of each owner, i.e., each mutator the call is attributed
+    to, under data[owner]["phases"][phase].
+
+    enabled: if False, nothing is measured
+    stats: dict the bucket bounds are written to (e.g., DATA["phase_timer"])
+    """
+
+    enabled: bool = True
+    stats: dict = field(default_factory=dict)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self._bounds_ns: List[int] = [bound * 1000 for bound in BUCKET_BOUNDS_US]
+        self._started: Dict[str, int] = {}
+        self._durations: Dict[str, int] = {}
+        self.owners: List[str] = []
+        self.stats.update({"enabled": self.enabled, "bucket_bounds_us": list(BUCKET_BOUNDS_US)})
+
+    def begin(self) -> None:
+        """Start a new call, discards everything measured but not flushed."""
+        self._started.clear()
+        self._durations.clear()
+        self.owners = []
+
+    def start(self, phase: str) -> None:
+        if self.enabled:
+            self._started[phase] = time.perf_counter_ns()
+
+    def stop(self, phase: str) -> None:
+        if self.enabled:
+            started = self._started.pop(phase, None)
+            if started is not None:
+                self._durations[phase] = (
+                    self._durations.get(phase, 0) + time.perf_counter_ns() - started
+                )
+
+    def flush(self, data: dict) -> None:
+        """Add the durations of the current call to the histograms of its owners."""
+        if self.enabled and self._durations:
+            for owner in self.owners:
+                phases = data[owner].setdefault("phases", {})
+                for phase, duration in self._durations.items():
+                    histogram = phases.get(phase)
+                    if histogram is None:
+                        histogram = phases[phase] = new_histogram()
+                    histogram["count"] += 1
+                    histogram["total_ns"] += duration
+                    histogram["buckets"][bisect.bisect_left(self._bounds_ns, duration)] += 1
+        self.begin()
@@ -0,0 +1,72 @@
+import functools
+import logging
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from plugin_base.input_profile import InputProfile, build_profile
+from runtime.tree_cache import content_hash
+
+
+@dataclass
+class ProfileStore:
+    """Bounded store of input profiles, keyed by a content hash of the input.
+
+    max_entries: maximal number of stored profiles. Profiles are small, so this can be large.
+    min_energy: energy of a parsable input with (almost) no structure
+    max_energy: upper bound for the energy of any input
+    unparsable_energy: energy of inputs that are not well-formed, only the fallback mutator
+        can work on them
+    tree_cache: TreeCache the inputs are parsed with. The first fuzz() of a new queue entry
+        then reuses the tree of its profile.
+    """
+
+    max_entries: int = 4096
+    min_energy: int = 8
+    max_energy: int = 256
+    unparsable_energy: int = 2
+    tree_cache: Any = None
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self._profiles: "OrderedDict[bytes, InputProfile]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def get(self, buffer: bytes, key: Optional[bytes] = None) -> InputProfile:
+        """Return the profile of the buffer, compute it if it is not known yet.
+
+        Args:
+            buffer (bytes): the input
+            key (Optional[bytes]): content hash of the input, if already computed
+
+        Returns:
+            InputProfile: the profile of the input
+        """
+        if key is None:
+            key = content_hash(buffer)
+
+        profile = self._profiles.get(key)
+        if profile is None:
+            parse = None
+            if self.tree_cache is not None:
+                parse = functools.partial(self.tree_cache.peek_tree, key=key)
+            profile = build_profile(buffer, parse)
+            self._profiles.update({key: profile})
+            if self.max_entries < len(self._profiles):
+                self._profiles.popitem(last=False)
+        else:
+            self._profiles.move_to_end(key)
+
+        return profile
+
+    def energy(self, profile: InputProfile) -> int:
+        """Number of fuzz iterations for an input. Grows logarithmically with the structural
+        richness of the input. Unparsable inputs get a short budget."""
+        if not profile.parsable:
+            return self.unparsable_energy
+
+        energy = round(self.min_energy * math.log2(2 + profile.richness))
+        return max(self.min_energy, min(self.max_energy, energy))
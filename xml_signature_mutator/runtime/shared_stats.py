@@ -0,0 +1,250 @@
+import contextlib
+import fcntl
+import logging
+import mmap
+import os
+import pathlib
+import struct
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+# counters that are shared, everything the metrics and schedulers derive their rates from
+COUNTERS = ("execs", "successful_mut", "validated", "well_formed", "saml_valid", "new_finds")
+
+MAGIC = b"XSMSTAT1"
+NAME_SIZE = 32
+# magic, max_slots, max_mutators, number of counters, number of registered mutators
+_HEADER = struct.Struct("<8sIIII")
+_HEADER_SIZE = 64
+# instance name, pid, time of the last update
+_SLOT_HEADER = struct.Struct(f"<{NAME_SIZE}sQd")
+_SLOT_HEADER_SIZE = 64
+
+
+@dataclass
+class SharedStats:
+    """Counters of all fuzzer instances on a machine, in a memory-mapped file with a fixed
+    layout (e.g., in the sync dir of AFL++).
+
+    Every instance owns a slot it alone writes its counters to, so no atomic updates are
+    needed. The counters of the other instances are summed up when they are read. Slots are
+    identified by the instance name, a restarted instance takes over its old slot and
+    republishes its restored counters, so the instance name must be stable across restarts.
+    An instance that restores its counters under a new name passes its previous name, that
+    slot is cleared instead of being counted twice. Slots of stopped instances are kept, their
+    findings are still evidence. Only if all slots are taken, the slot of the stopped instance
+    that was updated least recently is reclaimed.
+
+    Layout: header, names of the registered mutators (NAME_SIZE bytes each), then max_slots
+    slots. A slot starts with its instance name, pid and time of the last update, followed by
+    len(COUNTERS) unsigned 64-bit counters per mutator. Creating the file, claiming a slot and
+    registering mutators is done under an exclusive lock of path.lock.
+
+    path: the shared file, created by the first instance
+    instance: name of this instance, unique per machine and stable across restarts
+    previous: name this instance published its restored counters under before, if different
+    interval: seconds between two synchronizations, see due
+    max_slots: maximal number of instances, only used when the file is created
+    max_mutators: maximal number of mutators, only used when the file is created
+    """
+
+    path: pathlib.Path
+    instance: str
+    previous: Optional[str] = None
+    interval: float = 1.0
+    max_slots: int = 64
+    max_mutators: int = 64
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self.path = pathlib.Path(self.path)
+        encoded_instance = self.instance.encode("utf-8")
+        if not 0 < len(encoded_instance) <= NAME_SIZE:
+            raise ValueError(f"Instance name must have 1 to {NAME_SIZE} bytes")
+        self._instance = encoded_instance.ljust(NAME_SIZE, b"\0")
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock_file = open(self.path.with_name(self.path.name + ".lock"), "a+b")
+        self._columns: Dict[str, int] = {}
+        self._last_sync = 0.0
+
+        with self._locked():
+            self._map = self._open()
+            self._slot = self._claim_slot()
+
+    @contextlib.contextmanager
+    def _locked(self):
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open(self) -> mmap.mmap:
+        if not self.path.exists() or self.path.stat().st_size == 0:
+            size = (
+                _HEADER_SIZE
+                + self.max_mutators * NAME_SIZE
+                + self.max_slots * self._slot_size(self.max_mutators)
+            )
+            with open(self.path, "wb") as file:
+                file.write(_HEADER.pack(MAGIC, self.max_slots, self.max_mutators, len(COUNTERS), 0))
+                file.truncate(size)
+
+        with open(self.path, "r+b") as file:
+            shared_map = mmap.mmap(file.fileno(), 0)
+
+        magic, max_slots, max_mutators, counters, _ = _HEADER.unpack_from(shared_map, 0)
+        if magic != MAGIC or counters != len(COUNTERS):
+            shared_map.close()
+            raise ValueError(f"{self.path} is not a shared statistics file of this version")
+        # the layout is fixed by the instance that created the file
+        self.max_slots = max_slots
+        self.max_mutators = max_mutators
+        self._row_length = max_mutators * len(COUNTERS)
+        self._row = struct.Struct(f"<{self._row_length}Q")
+        return shared_map
+
+    @staticmethod
+    def _slot_size(max_mutators: int) -> int:
+        return _SLOT_HEADER_SIZE + max_mutators * len(COUNTERS) * 8
+
+    def _slot_offset(self, slot: int) -> int:
+        return (
+            _HEADER_SIZE + self.max_mutators * NAME_SIZE + slot * self._slot_size(self.max_mutators)
+        )
+
+    def _claim_slot(self) -> int:
+        own_slot = free_slot = stale_slot = None
+        stale_time = None
+        for slot in range(self.max_slots):
+            name, pid, updated = _SLOT_HEADER.unpack_from(self._map, self._slot_offset(slot))
+            if name == self._instance:
+                own_slot = slot
+                if pid != os.getpid() and _alive(pid):
+                    raise ValueError(
+                        f"Instance {self.instance!r} is already running with pid {pid}"
+                    )
+            elif name == b"\0" * NAME_SIZE:
+                if free_slot is None:
+                    free_slot = slot
+            elif (
+                self.previous is not None
+                and name.rstrip(b"\0").decode("utf-8", "replace") == self.previous
+                and not _alive(pid)
+            ):
+                # the restored counters of this instance are republished in its new slot
+                self.logger.info("Clearing slot %d of the previous name %r.", slot, self.previous)
+                self._clear(slot)
+                if free_slot is None:
+                    free_slot = slot
+            elif not _alive(pid) and (stale_time is None or updated < stale_time):
+                stale_slot, stale_time = slot, updated
+
+        if own_slot is None and free_slot is None and stale_slot is not None:
+            self.logger.warning(
+                "All %d slots of %s are taken, reclaiming slot %d of a stopped instance.",
+                self.max_slots,
+                self.path,
+                stale_slot,
+            )
+            free_slot = stale_slot
+        slot = own_slot if own_slot is not None else free_slot
+        if slot is None:
+            raise ValueError(f"All {self.max_slots} slots of {self.path} are taken")
+
+        offset = self._slot_offset(slot)
+        _SLOT_HEADER.pack_into(self._map, offset, self._instance, os.getpid(), time.time())
+        # a restarted instance publishes its restored counters, a new one starts from 0
+        self._row.pack_into(self._map, offset + _SLOT_HEADER_SIZE, *([0] * self._row_length))
+        return slot
+
+    def _clear(self, slot: int) -> None:
+        offset = self._slot_offset(slot)
+        _SLOT_HEADER.pack_into(self._map, offset, b"", 0, 0.0)
+        self._row.pack_into(self._map, offset + _SLOT_HEADER_SIZE, *([0] * self._row_length))
+
+    def register(self, identifiers: Iterable[str]) -> None:
+        """Assign a column to every mutator. Mutators of other instances keep their columns."""
+        identifiers = list(identifiers)
+        with self._locked():
+            *_, registered = _HEADER.unpack_from(self._map, 0)
+            columns = {}
+            for column in range(registered):
+                offset = _HEADER_SIZE + column * NAME_SIZE
+                name = self._map[offset : offset + NAME_SIZE].rstrip(b"\0").decode("utf-8")
+                columns[name] = column
+
+            for identifier in identifiers:
+                if identifier in columns:
+                    continue
+                if self.max_mutators <= registered:
+                    raise ValueError(f"No column left for mutator {identifier!r} in {self.path}")
+                encoded = identifier.encode("utf-8")
+                if NAME_SIZE < len(encoded):
+                    raise ValueError(f"Mutator identifier {identifier!r} is too long")
+                offset = _HEADER_SIZE + registered * NAME_SIZE
+                self._map[offset : offset + NAME_SIZE] = encoded.ljust(NAME_SIZE, b"\0")
+                columns[identifier] = registered
+                registered += 1
+
+            struct.pack_into("<I", self._map, _HEADER.size - 4, registered)
+
+        self._columns = {identifier: columns[identifier] for identifier in identifiers}
+
+    def due(self) -> bool:
+        """Return True, if the last synchronization is at least interval seconds ago."""
+        now = time.monotonic()
+        if now - self._last_sync < self.interval:
+            return False
+        self._last_sync = now
+        return True
+
+    def publish(self, data: dict) -> None:
+        """Write the counters of this instance to its slot."""
+        offset = self._slot_offset(self._slot)
+        row = list(self._row.unpack_from(self._map, offset + _SLOT_HEADER_SIZE))
+        for identifier, column in self._columns.items():
+            metrics = data[identifier]
+            for position, counter in enumerate(COUNTERS):
+                row[column * len(COUNTERS) + position] = metrics[counter]
+        self._row.pack_into(self._map, offset + _SLOT_HEADER_SIZE, *row)
+        _SLOT_HEADER.pack_into(self._map, offset, self._instance, os.getpid(), time.time())
+
+    def others(self) -> Dict[str, Dict[str, int]]:
+        """Return the summed counters of all other instances for every registered mutator."""
+        rows = []
+        for slot in range(self.max_slots):
+            offset = self._slot_offset(slot)
+            # instance names are never empty, unused slots start with 0
+            if slot != self._slot and self._map[offset] != 0:
+                rows.append(self._row.unpack_from(self._map, offset + _SLOT_HEADER_SIZE))
+        sums = [sum(column) for column in zip(*rows)] if rows else [0] * self._row_length
+
+        return {
+            identifier: {
+                counter: sums[column * len(COUNTERS) + position]
+                for position, counter in enumerate(COUNTERS)
+            }
+            for identifier, column in self._columns.items()
+        }
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._lock_file.close()
+
+
+def _alive(pid: int) -> bool:
+    """Return True, if a process with the given pid exists."""
+    if pid <= 0:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # exists, but belongs to another user
+        return True
+    return True
@@ -0,0 +1,384 @@
+import base64
+import copy
+import hashlib
+import logging
+import pathlib
+import re
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from lxml import etree
+from lxml.etree import XMLSyntaxError
+from runtime.tree_cache import content_hash
+
+DS_NS = "http://www.w3.org/2000/09/xmldsig#"
+NSMAP = {"ds": DS_NS}
+
+ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+INCLUSIVE_C14N = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+# algorithm: (exclusive, with_comments)
+CANONICALIZATIONS = {
+    "http://www.w3.org/2001/10/xml-exc-c14n#": (True, False),
+    "http://www.w3.org/2001/10/xml-exc-c14n#WithComments": (True, True),
+    INCLUSIVE_C14N: (False, False),
+    "http://www.w3.org/TR/2001/REC-xml-c14n-20010315#WithComments": (False, True),
+}
+DIGESTS = {
+    "http://www.w3.org/2000/09/xmldsig#sha1": "sha1",
+    "http://www.w3.org/2001/04/xmlenc#sha256": "sha256",
+    "http://www.w3.org/2001/04/xmldsig-more#sha384": "sha384",
+    "http://www.w3.org/2001/04/xmlenc#sha512": "sha512",
+}
+# algorithm: name of the xmlsec transform
+SIGNATURES = {
+    "http://www.w3.org/2000/09/xmldsig#rsa-sha1": "TransformRsaSha1",
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256": "TransformRsaSha256",
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha384": "TransformRsaSha384",
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha512": "TransformRsaSha512",
+}
+
+_XML_NS = "{http://www.w3.org/XML/1998/namespace}"
+_FIND_ID = etree.XPath("//*[@ID=$id or @Id=$id or @AssertionID=$id]")
+_PEM_BODY = re.compile(rb"-----BEGIN CERTIFICATE-----(.*?)-----END CERTIFICATE-----", re.S)
+
+
+@dataclass
+class SignatureRepair:
+    """Recomputes the digests and signatures of mutants with a test key, so mutated
+    structure gets past the signature verification of targets that trust the test key.
+
+    Every ds:Reference is digested again (enveloped-signature and (exclusive) c14n transforms),
+    then ds:SignedInfo is signed again with the key. With a certificate, it also replaces the
+    ds:X509Certificate of the mutant. A signature is repaired after the signatures in the
+    subtrees it references. References and signatures with other algorithms are left as they
+    are. Mutants are selected by their content hash, so the same mutant is
+    always either repaired or not (e.g., during calibration and trimming).
+
+    The key is loaded once, xmlsec is only imported then. Digests are cached by the
+    serialization of the referenced subtree (and the transforms), signatures by the
+    canonicalized ds:SignedInfo: mutants that did not change a signed subtree are repaired
+    without canonicalizing or signing it again.
+
+    key_file: PEM file of the private key of the test key
+    cert_file: PEM file of the certificate of the test key, optional
+    rate: share of the mutants that are repaired
+    max_entries: maximal number of cached digests and signatures, each
+    parser: parser of the mutants, configured like the one of the mutators
+    stats: dict the counters are written to (e.g., DATA["signature_repair"])
+    """
+
+    key_file: Optional[str] = None
+    cert_file: Optional[str] = None
+    rate: float = 1.0
+    max_entries: int = 1024
+    parser: Any = None
+    stats: dict = field(default_factory=dict)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        if not 0 <= self.rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        for counter in (
+            "selected",
+            "repaired",
+            "unparsable",
+            "unsigned",
+            "unsupported",
+            "digest_hits",
+            "digest_misses",
+            "signature_hits",
+            "signature_misses",
+        ):
+            self.stats.setdefault(counter, 0)
+        self._key = None
+        self._xmlsec = None
+        self._certificate: Optional[str] = None
+        self._digests: "OrderedDict[bytes, str]" = OrderedDict()
+        self._signatures: "OrderedDict[bytes, str]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.key_file is not None and 0 < self.rate
+
+    def selected(self, buffer: bytes) -> bool:
+        """Return True, if the mutant is to be repaired."""
+        threshold = int(self.rate * 0xFFFFFFFF)
+        return int.from_bytes(content_hash(bytes(buffer))[:4], "little") <= threshold
+
+    def repair(self, buffer: bytes) -> bytes:
+        """Return the mutant with recomputed digests and signatures. Mutants that are not
+        selected, cannot be parsed or are not signed are returned as they are."""
+        if not self.enabled or not self.selected(buffer):
+            return buffer
+        self.stats["selected"] += 1
+
+        try:
+            root = etree.fromstring(bytes(buffer), self.parser)
+        except (XMLSyntaxError, ValueError):
+            self.stats["unparsable"] += 1
+            return buffer
+
+        signatures = root.xpath("//ds:Signature[ds:SignedInfo]", namespaces=NSMAP)
+        if not signatures:
+            self.stats["unsigned"] += 1
+            return buffer
+        signatures = _order(root, signatures)
+
+        self._load_key()
+        # before any digest, a signature may be in the subtree another signature references
+        if self._certificate is not None:
+            for signature in signatures:
+                for certificate in signature.iterfind(".//ds:X509Certificate", NSMAP):
+                    _set_text(certificate, self._certificate)
+
+        repaired = False
+        for signature in signatures:
+            try:
+                repaired |= self._repair_signature(root, signature)
+            except Exception as exp:
+                # any failure, e.g., etree.C14NError for mutated namespace URIs that cannot be
+                # canonicalized or xmlsec.Error. A mutant must never abort AFL++.
+                self.logger.debug("Could not repair a signature. %s: %s", type(exp).__name__, exp)
+                self.stats["unsupported"] += 1
+        if not repaired:
+            return buffer
+
+        self.stats["repaired"] += 1
+        # the serialization drops the declaration, keep it as it was
+        declaration = b""
+        stripped = bytes(buffer).lstrip()
+        if stripped.startswith(b"<?xml"):
+            declaration = stripped[: stripped.find(b"?>") + 2] + b"\n"
+        return declaration + etree.tostring(
+            root.getroottree(), xml_declaration=False, encoding="unicode"
+        ).encode("utf-8")
+
+    def _load_key(self) -> None:
+        if self._key is not None:
+            return
+        import xmlsec
+
+        self._xmlsec = xmlsec
+        self._key = xmlsec.Key.from_file(self.key_file, xmlsec.constants.KeyDataFormatPem)
+        if self.cert_file:
+            pem = pathlib.Path(self.cert_file).read_bytes()
+            match = _PEM_BODY.search(pem)
+            if match is None:
+                raise ValueError(f"No certificate in {self.cert_file}")
+            self._certificate = b"".join(match.group(1).split()).decode("ascii")
+        self.logger.info("Loaded signing key %s.", self.key_file)
+
+    def _repair_signature(self, root: Any, signature: Any) -> bool:
+        signed_info = signature.find("ds:SignedInfo", NSMAP)
+        signature_value = signature.find("ds:SignatureValue", NSMAP)
+        method = signed_info.find("ds:SignatureMethod", NSMAP)
+        c14n = signed_info.find("ds:CanonicalizationMethod", NSMAP)
+        if (
+            signature_value is None
+            or method is None
+            or method.get("Algorithm") not in SIGNATURES
+            or c14n is None
+            or c14n.get("Algorithm") not in CANONICALIZATIONS
+        ):
+            self.stats["unsupported"] += 1
+            return False
+
+        for reference in signed_info.findall("ds:Reference", NSMAP):
+            digest_value = reference.find("ds:DigestValue", NSMAP)
+            digest = self._digest(root, signature, reference)
+            if digest is None or digest_value is None:
+                self.stats["unsupported"] += 1
+                continue
+            _set_text(digest_value, digest)
+
+        canonical = self._canonicalize(signed_info, c14n.get("Algorithm"), c14n)
+        key = content_hash(method.get("Algorithm").encode("utf-8") + canonical)
+        value = self._cached(self._signatures, key, "signature")
+        if value is None:
+            context = self._xmlsec.SignatureContext()
+            context.key = self._key
+            transform = getattr(self._xmlsec.constants, SIGNATURES[method.get("Algorithm")])
+            value = base64.b64encode(context.sign_binary(canonical, transform)).decode("ascii")
+            self._store(self._signatures, key, value)
+        _set_text(signature_value, value)
+        return True
+
+    def _digest(self, root: Any, signature: Any, reference: Any) -> Optional[str]:
+        method = reference.find("ds:DigestMethod", NSMAP)
+        algorithm = DIGESTS.get(method.get("Algorithm")) if method is not None else None
+        target = _target(root, reference)
+        if algorithm is None or target is None:
+            return None
+        # e.g., the ID of the target copied to the signature. The digest would cover the
+        # signature it is written to, with the enveloped transform nothing at all.
+        if _contains(signature, target):
+            return None
+
+        transforms = list(reference.iterfind("ds:Transforms/ds:Transform", NSMAP))
+        c14n = [node for node in transforms if node.get("Algorithm") in CANONICALIZATIONS]
+        enveloped = any(node.get("Algorithm") == ENVELOPED for node in transforms)
+        # other transforms (e.g., XPath) are not supported, neither is canonicalizing twice
+        if 1 < len(c14n) or len(c14n) + enveloped != len(transforms):
+            return None
+        # without a canonicalization transform, the node-set is canonicalized with c14n 1.0
+        c14n_node = c14n[0] if c14n else None
+        c14n_algorithm = c14n_node.get("Algorithm") if c14n_node is not None else INCLUSIVE_C14N
+
+        # the serialization of the subtree and the namespaces in scope (for the PrefixList)
+        # determine its exclusive canonicalization. Inclusive canonicalization also depends on
+        # the xml:* attributes of the ancestors.
+        exclusive = CANONICALIZATIONS[c14n_algorithm][0]
+        key = None
+        if exclusive:
+            context = (algorithm, c14n_algorithm, _prefixes(c14n_node), str(enveloped))
+            namespaces = sorted((prefix or "", uri) for prefix, uri in target.nsmap.items())
+            key = content_hash(repr((context, namespaces)).encode("utf-8") + etree.tostring(target))
+            digest = self._cached(self._digests, key, "digest")
+            if digest is not None:
+                return digest
+        else:
+            self.stats["digest_misses"] += 1
+
+        envelops = enveloped and _contains(target, signature)
+        if envelops or not exclusive:
+            path = _path(target, signature) if envelops else None
+            target = _detach(target, inherit_xml=not exclusive)
+            if path is not None:
+                _remove_path(target, path)
+        canonical = self._canonicalize(target, c14n_algorithm, c14n_node)
+
+        digest = base64.b64encode(hashlib.new(algorithm, canonical).digest()).decode("ascii")
+        if key is not None:
+            self._store(self._digests, key, digest)
+        return digest
+
+    @staticmethod
+    def _canonicalize(node: Any, algorithm: str, method: Any) -> bytes:
+        exclusive, with_comments = CANONICALIZATIONS[algorithm]
+        prefixes = _prefixes(method).split() or None
+        return etree.tostring(
+            node,
+            method="c14n",
+            exclusive=exclusive,
+            with_comments=with_comments,
+            inclusive_ns_prefixes=prefixes if exclusive else None,
+        )
+
+    def _cached(self, cache: OrderedDict, key: bytes, name: str) -> Optional[str]:
+        value = cache.get(key)
+        if value is None:
+            self.stats[f"{name}_misses"] += 1
+            return None
+        self.stats[f"{name}_hits"] += 1
+        cache.move_to_end(key)
+        return value
+
+    def _store(self, cache: OrderedDict, key: bytes, value: str) -> None:
+        cache[key] = value
+        if self.max_entries < len(cache):
+            cache.popitem(last=False)
+
+
+def _set_text(element: Any, text: str) -> None:
+    """Replace the content of element, mutants may have added children (e.g., comments)."""
+    del element[:]
+    element.text = text
+
+
+def _target(root: Any, reference: Any) -> Optional[Any]:
+    """Return the element a same-document reference refers to."""
+    uri = reference.get("URI", "")
+    if not uri:
+        return root
+    if not uri.startswith("#"):
+        return None
+    targets = _FIND_ID(root, id=uri[1:])
+    # the first element with the ID, like most verifiers
+    return targets[0] if targets else None
+
+
+def _order(root: Any, signatures: List[Any]) -> List[Any]:
+    """Return the signatures in the order they are repaired: every signature after the
+    signatures in the subtrees it references, as repairing them changes the subtrees. Cyclic
+    references cannot be satisfied, the innermost of the remaining signatures is next then."""
+    pending = sorted(signatures, key=lambda signature: -sum(1 for _ in signature.iterancestors()))
+    targets = {
+        signature: [
+            _target(root, reference)
+            for reference in signature.iterfind("ds:SignedInfo/ds:Reference", NSMAP)
+        ]
+        for signature in pending
+    }
+    ordered = []
+    while pending:
+        ready = next(
+            (
+                signature
+                for signature in pending
+                if not any(
+                    other is not signature and target is not None and _contains(target, other)
+                    for target in targets[signature]
+                    for other in pending
+                )
+            ),
+            pending[0],
+        )
+        pending.remove(ready)
+        ordered.append(ready)
+    return ordered
+
+
+def _prefixes(method: Any) -> str:
+    """Return the InclusiveNamespaces PrefixList of a canonicalization method."""
+    if method is None:
+        return ""
+    for child in method:
+        if isinstance(child.tag, str) and etree.QName(child).localname == "InclusiveNamespaces":
+            return child.get("PrefixList", "")
+    return ""
+
+
+def _detach(element: Any, inherit_xml: bool) -> Any:
+    """Return a copy of the subtree of element that canonicalizes like the subtree in its
+    document. A deepcopy only declares the namespaces it uses, the copy declares all namespaces
+    in scope and, with inherit_xml, the xml:* attributes of the ancestors (inclusive c14n)."""
+    detached = etree.Element(element.tag, nsmap=element.nsmap)
+    if inherit_xml:
+        for ancestor in reversed(list(element.iterancestors())):
+            for key, value in ancestor.attrib.items():
+                if key.startswith(_XML_NS):
+                    detached.set(key, value)
+    detached.attrib.update(element.attrib)
+    detached.text = element.text
+    detached.extend(copy.deepcopy(child) for child in element)
+    return detached
+
+
+def _contains(ancestor: Any, node: Any) -> bool:
+    return node is ancestor or any(parent is ancestor for parent in node.iterancestors())
+
+
+def _path(ancestor: Any, node: Any) -> List[int]:
+    """Return the child indexes that lead from ancestor to node."""
+    path = []
+    while node is not ancestor:
+        parent = node.getparent()
+        path.append(parent.index(node))
+        node = parent
+    return path[::-1]
+
+
+def _remove_path(ancestor: Any, path: List[int]) -> None:
+    """Remove the node at path. Like the enveloped-signature transform, the text after it is
+    kept, lxml would remove it with the node."""
+    node = ancestor
+    for index in path:
+        node = node[index]
+    if node.tail:
+        previous = node.getprevious()
+        if previous is not None:
+            previous.tail = (previous.tail or "") + node.tail
+        else:
+            node.getparent().text = (node.getparent().text or "") + node.tail
+    node.getparent().remove(node)
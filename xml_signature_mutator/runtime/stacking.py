@@ -0,0 +1,48 @@
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import List
+
+
+@dataclass
+class StackingScheduler:
+    """Chooses the length of stacked (havoc-style) mutation chains.
+
+    Chain lengths are powers of two up to 2**max_stack_pow2. Each length is chosen with a
+    probability proportional to its smoothed find rate, so lengths that lead to new findings
+    are chosen more often. smoothing is the number of chains a length is treated as unexplored,
+    i.e., all lengths are chosen about equally often until they were used that many times.
+
+    stats: dict the counters are written to (e.g., DATA["stacking"])
+    rng: random number generator the lengths are drawn from
+    """
+
+    enabled: bool = False
+    max_stack_pow2: int = 3
+    smoothing: int = 1000
+    stats: dict = field(default_factory=dict)
+    rng: random.Random = field(default_factory=random.Random)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        if self.max_stack_pow2 < 0:
+            raise ValueError("max_stack_pow2 must not be negative")
+        self.lengths: List[int] = [1 << exponent for exponent in range(self.max_stack_pow2 + 1)]
+        for length in self.lengths:
+            self.stats.setdefault(str(length), {"chains": 0, "new_finds": 0})
+
+    def chain_length(self) -> int:
+        """Choose the length of the next chain and count it."""
+        weights = [
+            (self.stats[str(length)]["new_finds"] + 1)
+            / (self.stats[str(length)]["chains"] + self.smoothing)
+            for length in self.lengths
+        ]
+        length = self.rng.choices(population=self.lengths, weights=weights, k=1).pop()
+        self.stats[str(length)]["chains"] += 1
+        return length
+
+    def record_find(self, length: int) -> None:
+        """Attribute a new finding to the chain length that produced it."""
+        if str(length) in self.stats:
+            self.stats[str(length)]["new_finds"] += 1
@@ -0,0 +1,119 @@
+import csv
+import logging
+import os
+import pathlib
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from runtime.phase_timer import PHASES
+
+COUNTERS = (
+    "execs",
+    "successful_mut",
+    "validated",
+    "well_formed",
+    "saml_valid",
+    "new_finds",
+    "percent_successful_mut",
+    "percent_well_formed",
+    "percent_saml_valid",
+    "percent_new_finds",
+)
+
+COLUMNS = (
+    ("timestamp", "event", "mutator")
+    + COUNTERS
+    + ("probability", "stage_duration")
+    + tuple(f"{phase}_{suffix}" for phase in PHASES for suffix in ("count", "total_ns"))
+)
+
+
+@dataclass
+class StatsSink:
+    """Appends snapshots of the per-mutator statistics to a CSV file, one row per mutator and
+    event. Kept apart from the diagnostic log, so campaigns can be evaluated without parsing
+    the log.
+
+    Rows are buffered and written in blocks of buffer_size bytes. Once the file is bigger than
+    max_bytes, it is rotated: path becomes path.1, path.1 becomes path.2, and so on. At most
+    backup_count rotated files are kept.
+
+    path: the CSV file. Appended to, if it already exists.
+    """
+
+    path: pathlib.Path
+    max_bytes: int = 64 * 1024 * 1024
+    backup_count: int = 5
+    buffer_size: int = 64 * 1024
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self.path = pathlib.Path(self.path)
+        self._file = None
+        self._writer = None
+        self._size = 0
+
+    def _open(self) -> None:
+        self._file = open(self.path, "a", buffering=self.buffer_size, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        # tell() of a text file flushes it, the size is tracked from here on
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._size += self._writer.writerow(COLUMNS)
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for number in range(self.backup_count - 1, 0, -1):
+            rotated = self.path.with_name(f"{self.path.name}.{number}")
+            if rotated.exists():
+                os.replace(rotated, self.path.with_name(f"{self.path.name}.{number + 1}"))
+        if self.backup_count:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink()
+        self._open()
+
+    def snapshot(
+        self, event: str, data: dict, state: dict, timestamp: Optional[float] = None
+    ) -> None:
+        """Append one row per mutator with its current counters.
+
+        Args:
+            event (str): what triggered the snapshot, e.g., "backup", "stage_change" or "final"
+            data (dict): the collected data (DATA)
+            state (dict): the state of the fuzzer (STATE), for probabilities and stage duration
+            timestamp (Optional[float]): time of the snapshot, defaults to now
+        """
+        if self._file is None:
+            self._open()
+
+        timestamp = round(time.time() if timestamp is None else timestamp, 3)
+        prob_dist = state.get("prob_dist") or {}
+        stage_duration = state.get("stage_duration")
+
+        for identifier, metrics in data.items():
+            # skip entries that are not mutator statistics (e.g., cache counters)
+            if "execs" not in metrics:
+                continue
+            phases = metrics.get("phases", {})
+            row = [timestamp, event, identifier]
+            row.extend(metrics.get(counter, 0) for counter in COUNTERS)
+            row.extend((prob_dist.get(identifier, ""), stage_duration))
+            for phase in PHASES:
+                histogram = phases.get(phase)
+                row.extend((histogram["count"], histogram["total_ns"]) if histogram else (0, 0))
+            self._size += self._writer.writerow(row)
+
+        if self.max_bytes and self.max_bytes < self._size:
+            self._rotate()
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
@@ -0,0 +1,117 @@
+import copy
+import hashlib
+import io
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from lxml import etree
+
+
+def content_hash(buffer: bytes) -> bytes:
+    """Key used for everything that is cached per input."""
+    return hashlib.blake2b(buffer, digest_size=16).digest()
+
+
+@dataclass
+class _CacheEntry:
+    size: int
+    xml_tree: Optional[Any] = None
+    parser_error: Optional[Exception] = None
+
+
+@dataclass
+class TreeCache:
+    """Bounded LRU cache of parsed inputs, keyed by a content hash of the input.
+
+    AFL++ passes the same queue entry to fuzz() many times in a row. The pristine tree is
+    parsed once and every caller gets a private deep copy, which is considerably cheaper than
+    parsing again. Inputs that are not parsable are cached as well, so the parser error does
+    not have to be produced again.
+
+    max_entries: maximal number of cached inputs
+    max_bytes: maximal summed size of the cached inputs (serialized size)
+    stats: dict the hit, miss and eviction counters are written to (e.g., DATA["tree_cache"])
+    """
+
+    max_entries: int = 32
+    max_bytes: int = 16 * 1024 * 1024
+    stats: dict = field(default_factory=dict)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        self._entries: "OrderedDict[bytes, _CacheEntry]" = OrderedDict()
+        self._size = 0
+        for counter in ("hits", "misses", "evictions"):
+            self.stats.setdefault(counter, 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_tree(self, buffer: bytes, key: Optional[bytes] = None) -> Any:
+        """Return a private copy of the parsed buffer. The caller may modify it freely.
+
+        Args:
+            buffer (bytes): the input to parse
+            key (Optional[bytes]): content hash of the input, if already computed
+
+        Raises:
+            etree.XMLSyntaxError: if the buffer is not parsable (or any other parser error)
+
+        Returns:
+            Any: the parsed document
+        """
+        entry = self._entry(buffer, key)
+        if entry.parser_error is not None:
+            raise entry.parser_error.with_traceback(None)
+
+        return copy.deepcopy(entry.xml_tree)
+
+    def peek_tree(self, buffer: bytes, key: Optional[bytes] = None) -> Any:
+        """Return the cached tree itself, e.g., to analyze a new queue entry. The caller must not
+        modify it. Parsing the entry here saves the parse of its first get_tree.
+
+        Raises:
+            etree.XMLSyntaxError: if the buffer is not parsable (or any other parser error)
+        """
+        entry = self._entry(buffer, key)
+        if entry.parser_error is not None:
+            raise entry.parser_error.with_traceback(None)
+
+        return entry.xml_tree
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._size = 0
+
+    def _entry(self, buffer: bytes, key: Optional[bytes]) -> _CacheEntry:
+        if key is None:
+            key = content_hash(buffer)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.stats["misses"] += 1
+            entry = _CacheEntry(size=len(buffer))
+            try:
+                entry.xml_tree = etree.parse(io.BytesIO(buffer))
+            except Exception as exp:
+                entry.parser_error = exp
+            self._insert(key, entry)
+        else:
+            self.stats["hits"] += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def _insert(self, key: bytes, entry: _CacheEntry) -> None:
+        # inputs that exceed the limit on their own are not cached at all
+        if self.max_entries < 1 or self.max_bytes < entry.size:
+            return
+
+        self._entries.update({key: entry})
+        self._size += entry.size
+
+        while self.max_entries < len(self._entries) or self.max_bytes < self._size:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= evicted.size
+            self.stats["evictions"] += 1
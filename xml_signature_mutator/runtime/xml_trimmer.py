@@ -0,0 +1,219 @@
+import copy
+import logging
+import math
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Tuple
+
+from lxml import etree
+from lxml.etree import XMLSyntaxError
+
+# kinds of trimming steps, in the order they are tried
+SUBTREE = "subtree"
+ATTRIBUTE = "attribute"
+TEXT = "text"
+TAIL = "tail"
+
+
+@dataclass
+class XmlTrimmer:
+    """Structure-aware trimming of queue entries for the AFL++ trim hooks.
+
+    AFL++ calls init_trim once per entry, then trim and post_trim alternately until post_trim
+    returns at least the number of steps init_trim returned. A step is kept, if AFL++ observed
+    the same coverage for it (post_trim(True)), otherwise it is dropped.
+
+    Steps of a parsable entry, coarse first: removing a subtree (every node but the root,
+    breadth-first, so large subtrees come first), then in document order removing an
+    attribute, removing a text, removing a tail. Only the first max_steps steps are tried.
+    Steps of subtrees that were removed before are skipped, as are steps that would not
+    shrink the entry. Every step keeps the entry well-formed. Unparsable entries are trimmed
+    like AFL++ does: by removing chunks of 1/16 of the entry.
+
+    Every step is applied to a copy of the tree of the kept steps, its node is found by the
+    path of child indices. A kept step is applied to the tree of the kept steps as well.
+    Removing a node and inserting it again is not exact in lxml (namespace declarations
+    move), so dropped steps are never undone on the tree AFL++ checked. Every step serializes
+    the whole entry, so the steps are capped rather than the entry size.
+
+    parser: parser of the entries, configured like the one of the mutators
+    stats: dict the counters are written to (e.g., DATA["trimming"])
+    max_steps: maximal number of steps of a parsable entry
+    """
+
+    parser: Any = None
+    stats: dict = field(default_factory=dict)
+    max_steps: int = 256
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        for counter in ("entries", "unparsable", "steps", "accepted", "removed_bytes"):
+            self.stats.setdefault(counter, 0)
+        self._reset(b"")
+
+    def _reset(self, buffer: bytes) -> None:
+        self._current = bytes(buffer)
+        self._candidate: Optional[bytes] = None
+        self._tree = None
+        self._trial: Optional[Tuple[str, Any, Optional[str]]] = None
+        self._declaration = b""
+        self._steps: List[Tuple[str, Any, Optional[str]]] = []
+        self._position = 0
+        self._count = 0
+        self._chunk = 0
+        self._offset = 0
+
+    @property
+    def current(self) -> bytes:
+        """The entry with all kept steps applied."""
+        return self._current
+
+    def init(self, buffer: bytes) -> int:
+        """Prepare trimming the entry. Returns the number of steps."""
+        self._reset(buffer)
+        self.stats["entries"] += 1
+
+        try:
+            self._tree = etree.fromstring(bytes(buffer), self.parser).getroottree()
+        except (XMLSyntaxError, ValueError):
+            self._tree = None
+
+        if self._tree is None:
+            self.stats["unparsable"] += 1
+            self._chunk = max(1, len(buffer) // 16)
+            # every step removes a chunk or moves past it
+            self._count = math.ceil(len(buffer) / self._chunk)
+            return self._count
+
+        # the serialization drops the declaration, keep it as it was
+        stripped = self._current.lstrip()
+        if stripped.startswith(b"<?xml"):
+            self._declaration = stripped[: stripped.find(b"?>") + 2] + b"\n"
+
+        root = self._tree.getroot()
+        nodes = [node for node in root.iter() if node is not root]
+        self._steps = (
+            [(SUBTREE, node, None) for node in self._breadth_first(root)]
+            + [
+                (ATTRIBUTE, element, key)
+                for element in root.iter(etree.Element)
+                for key in element.attrib.keys()
+            ]
+            + [(TEXT, node, None) for node in root.iter(etree.Element, etree.Comment) if node.text]
+            + [(TAIL, node, None) for node in nodes if node.tail]
+        )[: self.max_steps]
+        self._count = len(self._steps)
+        return self._count
+
+    def trim(self) -> bytes:
+        """Return the entry with the next step applied."""
+        if self._tree is None:
+            if len(self._current) <= self._offset:
+                self._candidate = None
+                return self._current
+            self._candidate = (
+                self._current[: self._offset] + self._current[self._offset + self._chunk :]
+            )
+            return self._candidate
+
+        while self._position < self._count:
+            kind, node, key = self._steps[self._position]
+            if self._applicable(kind, node, key):
+                trial = copy.deepcopy(self._tree)
+                self._apply(kind, self._find(trial, self._path(node)), key)
+                candidate = self._serialize(trial)
+                if len(candidate) < len(self._current):
+                    self._trial = (kind, node, key)
+                    self._candidate = candidate
+                    return candidate
+            self._position += 1
+
+        # nothing left, post_trim ends the trimming
+        self._candidate = None
+        return self._current
+
+    def post_trim(self, success: bool) -> int:
+        """Keep or drop the last step. Returns the index of the next step."""
+        if self._candidate is None:
+            return self._count
+
+        self.stats["steps"] += 1
+        if success:
+            self.stats["accepted"] += 1
+            self.stats["removed_bytes"] += len(self._current) - len(self._candidate)
+            self._current = self._candidate
+            if self._trial is not None:
+                # the same step on the same tree, the remaining steps refer to its nodes
+                self._apply(*self._trial)
+        elif self._tree is None:
+            # a removed chunk shifts the rest of the entry, so the offset only moves on if the
+            # chunk is kept
+            self._offset += self._chunk
+
+        self._candidate = None
+        self._trial = None
+        self._position += 1
+        return self._position
+
+    @staticmethod
+    def _breadth_first(root: Any) -> List[Any]:
+        """Return every node below root, level by level, in document order per level."""
+        nodes = []
+        level = list(root)
+        while level:
+            nodes.extend(level)
+            level = [child for node in level for child in node]
+        return nodes
+
+    @staticmethod
+    def _path(node: Any) -> List[int]:
+        """Return the child indices from the root to node."""
+        path = []
+        parent = node.getparent()
+        while parent is not None:
+            path.append(parent.index(node))
+            node, parent = parent, parent.getparent()
+        path.reverse()
+        return path
+
+    @staticmethod
+    def _find(tree: Any, path: List[int]) -> Any:
+        node = tree.getroot()
+        for index in path:
+            node = node[index]
+        return node
+
+    def _serialize(self, tree: Any) -> bytes:
+        return self._declaration + etree.tostring(
+            tree, xml_declaration=False, encoding="unicode"
+        ).encode("utf-8")
+
+    def _applicable(self, kind: str, node: Any, key: Optional[str]) -> bool:
+        root = self._tree.getroot()
+        if node is not root and not any(ancestor is root for ancestor in node.iterancestors()):
+            return False
+        if kind == ATTRIBUTE:
+            return key in node.attrib
+        if kind == TEXT:
+            return bool(node.text)
+        if kind == TAIL:
+            return bool(node.tail)
+        return True
+
+    @staticmethod
+    def _apply(kind: str, node: Any, key: Optional[str]) -> None:
+        if kind == SUBTREE:
+            # lxml removes the tail with the node, it belongs to the parent
+            if node.tail:
+                previous = node.getprevious()
+                if previous is not None:
+                    previous.tail = (previous.tail or "") + node.tail
+                else:
+                    parent = node.getparent()
+                    parent.text = (parent.text or "") + node.tail
+            node.getparent().remove(node)
+        elif kind == ATTRIBUTE:
+            del node.attrib[key]
+        elif kind == TEXT:
+            node.text = None
+        else:
+            node.tail = None
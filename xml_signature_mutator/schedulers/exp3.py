@@ -0,0 +1,78 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict, List
+
+from plugin_base import plugin_util
+from plugin_base.base_scheduler import BaseScheduler
+
+
+@dataclass
+class EXP3(BaseScheduler):
+    """EXP3 with exponential forgetting, for find rates that change over the campaign.
+
+    A new finding increases the weight of the chosen mutators by its importance-weighted
+    reward. Before every choice, all log weights are multiplied with decay, so old findings
+    lose their influence and the weights drift back towards uniform.
+
+    gamma: share of uniform exploration, between 0 and 1
+    decay: forgetting factor per execution. The influence of a finding halves after
+        ln(2) / (1 - decay) executions, about 70,000 for the default.
+
+    The last choice and its probabilities are kept in self.stats with the weights, so a finding
+    right after a restore is still rewarded.
+    """
+
+    gamma: float = 0.1
+    decay: float = 0.99999
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        if not 0 < self.gamma <= 1:
+            raise ValueError("gamma must be in (0, 1]")
+        if not 0 < self.decay <= 1:
+            raise ValueError("decay must be in (0, 1]")
+
+    def init(self, arms: List[str], data: dict, seed: str = "") -> None:
+        super().init(arms, data, seed)
+        log_weights = self.stats.setdefault("log_weights", {})
+        for arm in self.arms:
+            log_weights.setdefault(arm, 0.0)
+        self.stats.setdefault("last_chosen", [])
+        self.stats.setdefault("last_probabilities", {})
+
+    def probabilities(self) -> Dict[str, float]:
+        log_weights = self.stats["log_weights"]
+        highest = max(log_weights[arm] for arm in self.arms)
+        weights = [math.exp(log_weights[arm] - highest) for arm in self.arms]
+        total = sum(weights)
+        uniform = self.gamma / len(self.arms)
+        return {
+            arm: (1 - self.gamma) * weight / total + uniform
+            for arm, weight in zip(self.arms, weights)
+        }
+
+    def choose(self, k: int = 1) -> List[str]:
+        log_weights = self.stats["log_weights"]
+        for arm in self.arms:
+            log_weights[arm] *= self.decay
+
+        probabilities = self.probabilities()
+        chosen = self.rng.choices(population=self.arms, weights=probabilities.values(), k=k)
+        self.stats.update({"last_chosen": chosen, "last_probabilities": probabilities})
+        return list(chosen)
+
+    def record_find(self, arms: List[str]) -> None:
+        # only findings of the last choice, not of fallback mutations. The chain may have been
+        # cut short after a string-level mutator.
+        if not arms or list(arms) != self.stats["last_chosen"][: len(arms)]:
+            return
+
+        log_weights = self.stats["log_weights"]
+        for arm in set(arms):
+            estimated_reward = 1 / self.stats["last_probabilities"][arm]
+            log_weights[arm] += self.gamma * estimated_reward / len(self.arms)
+
+
+def register() -> None:
+    plugin_util.register_plugin("exp3", EXP3)
@@ -0,0 +1,32 @@
+import logging
+from dataclasses import dataclass
+from typing import Dict, List
+
+from plugin_base import plugin_util
+from plugin_base.base_scheduler import BaseScheduler
+
+
+@dataclass
+class Thompson(BaseScheduler):
+    """Thompson sampling with a Beta posterior of the find rate of every mutator. For each
+    mutation, a rate is drawn from every posterior and the mutator with the highest draw is
+    chosen."""
+
+    logger = logging.getLogger(__name__)
+
+    def _sample(self, arm: str) -> float:
+        rewards = self._rewards(arm)
+        return self.rng.betavariate(1 + rewards, 1 + max(0, self._pulls(arm) - rewards))
+
+    def choose(self, k: int = 1) -> List[str]:
+        return [max(self.arms, key=self._sample) for _ in range(k)]
+
+    def probabilities(self) -> Dict[str, float]:
+        # approximated by the normalized posterior means
+        means = {arm: (1 + self._rewards(arm)) / (2 + self._pulls(arm)) for arm in self.arms}
+        total = sum(means.values())
+        return {arm: mean / total for arm, mean in means.items()}
+
+
+def register() -> None:
+    plugin_util.register_plugin("thompson", Thompson)
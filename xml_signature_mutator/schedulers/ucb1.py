@@ -0,0 +1,46 @@
+import logging
+import math
+from dataclasses import dataclass
+from typing import Dict
+
+from plugin_base import plugin_util
+from plugin_base.base_scheduler import BaseScheduler
+
+
+@dataclass
+class UCB1(BaseScheduler):
+    """Chooses the mutator with the highest upper confidence bound of its find rate. Mutators
+    that were not executed yet are chosen first.
+
+    exploration: scales the confidence term. Find rates are small, lower values make the
+        scheduler commit to productive mutators sooner.
+    """
+
+    exploration: float = 1.0
+    logger = logging.getLogger(__name__)
+
+    def _scores(self) -> Dict[str, float]:
+        total = sum(self._pulls(arm) for arm in self.arms)
+        log_total = math.log(total) if 1 < total else 0.0
+
+        scores = {}
+        for arm in self.arms:
+            pulls = self._pulls(arm)
+            if pulls == 0:
+                scores[arm] = math.inf
+                continue
+            scores[arm] = self._rewards(arm) / pulls + self.exploration * math.sqrt(
+                2 * log_total / pulls
+            )
+        return scores
+
+    def probabilities(self) -> Dict[str, float]:
+        # ties are broken randomly
+        scores = self._scores()
+        best = max(scores.values())
+        leaders = sum(1 for score in scores.values() if score == best)
+        return {arm: 1 / leaders if score == best else 0.0 for arm, score in scores.items()}
+
+
+def register() -> None:
+    plugin_util.register_plugin("ucb1", UCB1)
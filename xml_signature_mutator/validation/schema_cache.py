@@ -0,0 +1,53 @@
+import importlib.util
+import logging
+import pathlib
+from typing import Dict, Optional
+
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+# Compiled schemas, keyed by the resolved path of the schema file.
+# Compiling the SAML protocol schema pulls in the whole import chain (assertion, xmldsig,
+# xenc, ...), so it is done only once per process.
+_SCHEMAS: Dict[pathlib.Path, etree.XMLSchema] = {}
+
+
+def default_schema_dir() -> pathlib.Path:
+    """Return the directory of the XSD files shipped with python3-saml. Only locates the
+    package, python3-saml itself is not imported."""
+    spec = importlib.util.find_spec("onelogin.saml2")
+    if spec is None or not spec.submodule_search_locations:
+        raise ModuleNotFoundError("python3-saml is required for the default SAML schemas")
+    return pathlib.Path(list(spec.submodule_search_locations)[0]).joinpath("schemas")
+
+
+def get_schema(schema: str, schema_dir: Optional[pathlib.Path] = None) -> etree.XMLSchema:
+    """Return the compiled schema, compile it on first use.
+
+    Args:
+        schema (str): File name of the schema or absolute path to it.
+        schema_dir (Optional[pathlib.Path]): Directory relative schema names are looked up in.
+            Defaults to the schema directory of python3-saml.
+
+    Returns:
+        etree.XMLSchema: The compiled schema
+    """
+    schema_path = pathlib.Path(schema)
+    if not schema_path.is_absolute():
+        schema_path = (schema_dir or default_schema_dir()).joinpath(schema_path)
+    schema_path = schema_path.resolve()
+
+    xml_schema = _SCHEMAS.get(schema_path)
+    if xml_schema is None:
+        logger.info("Compiling schema %s.", schema_path)
+        # use a plain parser, the default parser is configured for the mutators
+        xml_schema = etree.XMLSchema(etree.parse(str(schema_path), etree.XMLParser()))
+        _SCHEMAS.update({schema_path: xml_schema})
+
+    return xml_schema
+
+
+def clear() -> None:
+    """Drop all compiled schemas."""
+    _SCHEMAS.clear()
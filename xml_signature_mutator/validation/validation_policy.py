@@ -0,0 +1,101 @@
+import logging
+import random
+from dataclasses import dataclass, field
+from typing import List, Tuple
+
+MODES = ("full", "sampled", "deferred")
+
+
+@dataclass
+class ValidationPolicy:
+    """Decides which successful mutants are checked for well-formedness and SAML validity.
+
+    full: every mutant is validated when it is analyzed
+    sampled: 1 in sample_rate mutants of each mutator is validated when it is analyzed
+    deferred: no mutant is validated when it is analyzed. A uniform random sample of at most
+        max_deferred mutants is kept and validated later, e.g., at the next stage change.
+
+    The validity counters only cover the validated mutants. Rates relative to all mutants are
+    estimated by scaling with the share of validated mutants, see update_percentages in
+    afl_interface.
+
+    The sampling counters and the deferred sample are not part of stats (it is written to the
+    statistics), checkpoints take them with state() and restore_state().
+
+    stats: dict the counters are written to (e.g., DATA["validation"])
+    rng: random number generator of the reservoir sampling
+    """
+
+    mode: str = "full"
+    sample_rate: int = 16
+    max_deferred: int = 1024
+    stats: dict = field(default_factory=dict)
+    rng: random.Random = field(default_factory=random.Random)
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        if self.mode not in MODES:
+            raise ValueError(f"Unknown validation mode {self.mode!r}")
+        if self.sample_rate < 1:
+            raise ValueError("sample_rate must be at least 1")
+        if self.max_deferred < 1:
+            raise ValueError("max_deferred must be at least 1")
+
+        self._counters: dict = {}
+        self._deferred: List[Tuple[bytes, Tuple[str, ...]]] = []
+        self._offered = 0
+        self.stats.update({"mode": self.mode})
+        self.stats.setdefault("deferred_offered", 0)
+        self.stats.setdefault("deferred_validated", 0)
+
+    def should_validate(self, mutator_id: str) -> bool:
+        """Return True, if the mutant of the mutator is to be validated now."""
+        if self.mode == "full":
+            return True
+        if self.mode == "deferred":
+            return False
+
+        count = self._counters.get(mutator_id, 0)
+        self._counters[mutator_id] = count + 1
+        return count % self.sample_rate == 0
+
+    def defer(self, mutated_input: bytes, mutator_ids: List[str]) -> None:
+        """Offer a mutant for later validation. Only used in deferred mode.
+
+        Keeps a uniform sample of all offered mutants (reservoir sampling), so the sample is
+        not biased towards the start of a stage. Mutants are only copied, if they are kept.
+        """
+        if self.mode != "deferred":
+            return
+
+        self._offered += 1
+        self.stats["deferred_offered"] += 1
+        if len(self._deferred) < self.max_deferred:
+            self._deferred.append((bytes(mutated_input), tuple(mutator_ids)))
+            return
+
+        slot = self.rng.randrange(self._offered)
+        if slot < self.max_deferred:
+            self._deferred[slot] = (bytes(mutated_input), tuple(mutator_ids))
+
+    def state(self) -> dict:
+        """Return the state of the sampling, e.g., for a checkpoint."""
+        return {
+            "counters": dict(self._counters),
+            "deferred": list(self._deferred),
+            "offered": self._offered,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Continue the sampling from a state returned by state()."""
+        self._counters = dict(state["counters"])
+        self._deferred = list(state["deferred"])[: self.max_deferred]
+        self._offered = state["offered"]
+
+    def drain(self) -> List[Tuple[bytes, Tuple[str, ...]]]:
+        """Return the deferred mutants and start a new sample."""
+        deferred = self._deferred
+        self._deferred = []
+        self._offered = 0
+        self.stats["deferred_validated"] += len(deferred)
+        return deferred
@@ -0,0 +1,83 @@
+import logging
+import pathlib
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from lxml import etree
+from validation import schema_cache
+
+SAML_PROTOCOL_NS = "urn:oasis:names:tc:SAML:2.0:protocol"
+
+# Attributes every SAML protocol message (RequestAbstractType / StatusResponseType) must carry
+REQUIRED_ROOT_ATTRIBUTES = ("ID", "Version", "IssueInstant")
+
+
+@dataclass
+class ValidityOracle:
+    """Tiered SAML validity check. Tiers are applied in the given order and the check stops
+    at the first tier that fails. Cheap tiers should therefore come first."""
+
+    tiers: List[str] = field(default_factory=lambda: ["structural", "xsd"])
+    schema: str = "saml-schema-protocol-2.0.xsd"
+    schema_dir: Optional[str] = None
+    logger = logging.getLogger(__name__)
+
+    def __post_init__(self) -> None:
+        available_tiers: Dict[str, Callable[[Any], bool]] = {
+            "structural": self.check_structure,
+            "xsd": self.check_schema,
+        }
+
+        self._checks = []
+        for tier in self.tiers:
+            try:
+                self._checks.append(available_tiers[tier])
+            except KeyError as exc:
+                raise ValueError(f"Unknown validation tier {tier!r}") from exc
+
+        # see compile_schema, otherwise compiled on first use
+        self._xml_schema = None
+
+    def is_valid(self, xml_tree: Any) -> bool:
+        """Return True, if the tree passes all configured tiers.
+
+        Args:
+            xml_tree (Any): Parsed document or its root element
+
+        Returns:
+            bool: True, if all tiers passed. Otherwise, False.
+        """
+        for check in self._checks:
+            if not check(xml_tree):
+                return False
+        return True
+
+    def check_structure(self, xml_tree: Any) -> bool:
+        """Cheap pre-check: the root must be a SAML protocol message with all required
+        attributes. Anything failing here would also fail the schema validation."""
+        root = xml_tree.getroot() if isinstance(xml_tree, etree._ElementTree) else xml_tree
+
+        if not isinstance(root.tag, str) or not root.tag.startswith("{" + SAML_PROTOCOL_NS + "}"):
+            return False
+
+        for attribute in REQUIRED_ROOT_ATTRIBUTES:
+            if attribute not in root.attrib:
+                return False
+
+        return True
+
+    def compile_schema(self) -> None:
+        """Compile the schema now, if the xsd tier is used, instead of during the first
+        validated fuzzing iteration. Instances that do not validate right away (deferred
+        validation) do not call it. Compiled before the analysis pool forks, the workers share
+        the schema."""
+        if "xsd" in self.tiers and self._xml_schema is None:
+            self._xml_schema = schema_cache.get_schema(
+                self.schema, pathlib.Path(self.schema_dir) if self.schema_dir else None
+            )
+
+    def check_schema(self, xml_tree: Any) -> bool:
+        """Full validation against the compiled schema."""
+        if self._xml_schema is None:
+            self.compile_schema()
+        return self._xml_schema.validate(xml_tree)